@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Email template rendering benchmark
+Compares building a jinja2.Template from the inquiry email source on every
+render (what create_contact_email_html used to do) with rendering through
+the shared template environment, which compiles each template once.
+
+Usage: python benchmarks/email_render_benchmark.py [seconds]
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from jinja2 import Template
+
+from email_service import email_service, template_env
+
+INQUIRY = {
+    'name': "Ahmed Al-Rashid",
+    'email': "ahmed@example.com",
+    'phone': "+971551849702",
+    'company': "Al-Rashid Construction",
+    'inquiry_type': "heavy equipment",
+    'message': "We need a quote for two excavators.\nDelivery to Addis Ababa.",
+    'submitted_at': "2025-01-01 12:00:00 UTC",
+    'ip_address': "203.0.113.7"
+}
+
+
+def rate(render, seconds: float) -> float:
+    count = 0
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        render()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    source = (Path(template_env.loader.searchpath[0]) / "email/contact_inquiry.html").read_text()
+    context = email_service.contact_email_context(INQUIRY)
+
+    def compile_every_time():
+        return Template(source).render(**context)
+
+    def shared_environment():
+        return email_service.create_contact_email_html(INQUIRY)
+
+    def both_parts():
+        return email_service.render_contact_email(INQUIRY)
+
+    shared_environment()  # first call compiles (or loads bytecode)
+    results = [
+        ("Template() per email", rate(compile_every_time, seconds)),
+        ("shared Environment, HTML", rate(shared_environment, seconds)),
+        ("shared Environment, HTML+text", rate(both_parts, seconds)),
+    ]
+    baseline = results[0][1]
+    for name, renders in results:
+        print(f"{name:<32} {renders:10.0f} renders/s   {1000 / renders:7.3f} ms/render   {renders / baseline:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Image serving benchmark
+Requests a few small images over and over, as a product listing does, and
+compares Starlette's FileResponse (a stat and chunked thread-pool reads per
+request, how uploads used to be served) with http_cache.file_response,
+which keeps hot small files in memory. Both run in-process, so the numbers
+are handler cost without network or server overhead.
+
+Usage: python benchmarks/image_serving_benchmark.py [requests] [concurrency] [image_kb]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import FileResponse
+
+from file_serving import file_metrics, hot_files
+from http_cache import IMAGE_CACHE_POLICY, file_response
+
+
+def benchmark_app(directory: Path) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/before/{filename}")
+    async def before(filename: str):
+        return FileResponse(directory / filename, media_type="image/webp")
+
+    @app.get("/after/{filename}")
+    async def after(request: Request, filename: str):
+        return await file_response(request, directory / filename, "image/webp", IMAGE_CACHE_POLICY)
+
+    return app
+
+
+async def run(client: httpx.AsyncClient, prefix: str, names, requests: int, concurrency: int) -> float:
+    async def worker(count: int):
+        for i in range(count):
+            response = await client.get(f"/{prefix}/{names[i % len(names)]}")
+            assert response.status_code == 200
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(requests // concurrency) for _ in range(concurrency)))
+    return requests / (time.perf_counter() - start)
+
+
+async def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    image_kb = int(sys.argv[3]) if len(sys.argv) > 3 else 35
+
+    directory = Path(tempfile.mkdtemp(prefix="image-serving-benchmark-"))
+    names = []
+    for i in range(8):
+        names.append(f"image-{i}.card.webp")
+        (directory / names[-1]).write_bytes(os.urandom(image_kb * 1024))
+
+    transport = httpx.ASGITransport(app=benchmark_app(directory))
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        await run(client, "after", names, len(names) * hot_files.admit_after, 1)  # warm the memory cache
+        print(f"{len(names)} x {image_kb} KB images, {requests} requests, {concurrency} concurrent\n")
+        before = await run(client, "before", names, requests, concurrency)
+        after = await run(client, "after", names, requests, concurrency)
+
+    print(f"FileResponse      {before:8.0f} req/s")
+    print(f"file_response     {after:8.0f} req/s   {after / before:5.1f}x")
+    print(f"\nmemory cache: {hot_files.stats()}")
+    for entry in file_metrics.top(3):
+        print(f"  {entry['file']}: {entry['requests']} requests, memory hit rate {entry['memory_hit_rate']:.1%}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Serialization benchmark for GET /api/admin/products
+Compares FastAPI's response_model validation + JSON encoding with the
+orjson fast path used by the routes, and with the trusted read path that
+skips validation for documents stamped with the current schema version,
+at 10k product documents.
+
+Usage: python benchmarks/serialization_benchmark.py [documents] [rounds]
+"""
+
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from models import ProductItem, from_document, schema_version
+from pricing import price_fields
+from serialization import dumps
+
+
+def make_documents(count: int) -> List[dict]:
+    """Documents shaped like the ones stored in admin_products.
+
+    Built through ProductItem so they carry every field of the current
+    schema version, as documents the trusted path sees in production do.
+    """
+    return [
+        ProductItem(
+            id=f"product-{i}",
+            category_id=str(i % 4 + 1),
+            name=f"Hydraulic pump assembly {i}",
+            description="Heavy duty replacement pump for excavators and loaders. " * 4,
+            price=f"AED {1000 + i}",
+            **price_fields(f"AED {1000 + i}"),
+            part_number=f"04152-YZZA{i}",
+            image_urls=[f"/api/uploads/{i}-a.jpg", f"/api/uploads/{i}-b.jpg"],
+            is_featured=i % 10 == 0,
+            is_available=True,
+            created_at=datetime(2025, 1, 1, 12, 0, 0),
+            updated_at=datetime(2025, 1, 2, 12, 0, 0),
+        ).model_dump()
+        for i in range(count)
+    ]
+
+
+async def fastapi_path(documents, field) -> bytes:
+    """What the route did before: build models, validate again, encode with json"""
+    products = [ProductItem(**document) for document in documents]
+    content = await serialize_response(field=field, response_content=products)
+    return JSONResponse(content).body
+
+
+async def orjson_path(documents, field) -> bytes:
+    """What the route does now: build models once, encode with orjson"""
+    products = [ProductItem(**document) for document in documents]
+    return dumps(products)
+
+
+async def trusted_path(documents, field) -> bytes:
+    """Trusted documents: passed through without building models, then orjson"""
+    products = [
+        from_document(ProductItem, {**document, "schema_version": schema_version(ProductItem)})
+        for document in documents
+    ]
+    return dumps(products)
+
+
+async def measure(name, func, documents, field, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.process_time()
+        body = await func(documents, field)
+        timings.append(time.process_time() - start)
+    best = min(timings)
+    print(f"{name:<22} best {best * 1000:8.1f} ms CPU   mean {sum(timings) / rounds * 1000:8.1f} ms   {len(body) / 1024:8.0f} KiB")
+    return best, body
+
+
+async def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    documents = make_documents(count)
+    field = create_response_field(name="Response", type_=List[ProductItem])
+
+    print(f"GET /api/admin/products with {count} documents, {rounds} rounds\n")
+    baseline, baseline_body = await measure("response_model + json", fastapi_path, documents, field, rounds)
+    fast, fast_body = await measure("orjson fast path", orjson_path, documents, field, rounds)
+    trusted, trusted_body = await measure("trusted read path", trusted_path, documents, field, rounds)
+
+    assert json.loads(baseline_body) == json.loads(fast_body), "Response bodies differ"
+    assert json.loads(baseline_body) == json.loads(trusted_body), "Trusted response body differs"
+    print()
+    for name, best in (("orjson fast path", fast), ("trusted read path", trusted)):
+        print(f"CPU saving per request, {name}: {(baseline - best) * 1000:.1f} ms ({(1 - best / baseline) * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+SMTP delivery benchmark for inquiry notifications
+Sends notification emails to a local aiosmtpd server, first the way
+send_contact_email used to (a blocking smtplib session per message inside
+a coroutine) and then through the pooled aiosmtplib transport. Reports
+messages per second and the worst event loop stall seen by a heartbeat
+task while sending. The server adds an artificial delay to EHLO and DATA
+to stand in for network round trips to a real provider.
+
+Usage: python benchmarks/smtp_benchmark.py [messages] [latency_ms]
+"""
+
+import asyncio
+import smtplib
+import sys
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiosmtpd.controller import Controller
+
+from smtp_pool import SMTPPool
+
+HOST = "127.0.0.1"
+PORT = 8025
+
+
+class SlowHandler:
+    """Accepts every message after ``latency`` seconds per round trip"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.received = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        await asyncio.sleep(self.latency)
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.latency)
+        self.received += 1
+        return "250 Message accepted for delivery"
+
+
+def make_message(i: int) -> MIMEMultipart:
+    msg = MIMEMultipart('alternative')
+    msg['From'] = "sunstarintl.ae@gmail.com"
+    msg['To'] = "sunstarintl.ae@gmail.com"
+    msg['Subject'] = f"New Customer Inquiry - General - Customer {i}"
+    msg.attach(MIMEText("\n".join(["<p>Inquiry body</p>"] * 200), 'html'))
+    return msg
+
+
+async def legacy_send(msg):
+    """What send_contact_email did: a blocking session per message"""
+    server = smtplib.SMTP(HOST, PORT)
+    server.send_message(msg)
+    server.quit()
+
+
+async def heartbeat(stop: asyncio.Event, stalls: list):
+    """Record how late a 1 ms sleep wakes up, i.e. how long the loop was blocked"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        stalls.append(time.perf_counter() - start - 0.001)
+
+
+async def run(name, send, messages):
+    stop = asyncio.Event()
+    stalls = []
+    ticker = asyncio.create_task(heartbeat(stop, stalls))
+    await asyncio.sleep(0.01)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(send(make_message(i)) for i in range(messages)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await ticker
+    print(f"{name:<28} {messages / elapsed:8.1f} msg/s   {elapsed:6.2f} s   worst loop stall {max(stalls) * 1000:7.1f} ms")
+    return messages / elapsed
+
+
+async def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 5.0) / 1000
+
+    handler = SlowHandler(latency)
+    controller = Controller(handler, hostname=HOST, port=PORT)
+    controller.start()
+    try:
+        print(f"{messages} notification emails, {latency * 1000:.0f} ms per server round trip\n")
+        baseline = await run("blocking smtplib per message", legacy_send, messages)
+
+        results = {}
+        for size in (1, 4):
+            pool = SMTPPool(HOST, PORT, start_tls=False, size=size)
+            results[size] = await run(f"pooled aiosmtplib, size {size}", pool.send, messages)
+            print(f"{'':<28} {pool.connects} connections opened")
+            await pool.close()
+
+        assert handler.received == messages * 3, f"Server received {handler.received} messages"
+        print()
+        for size, rate in results.items():
+            print(f"Throughput, pool size {size}: {rate / baseline:.1f}x the blocking path")
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
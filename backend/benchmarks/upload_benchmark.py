@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Upload benchmark for POST /api/upload/images
+Uploads 10 images of a few MB each while another client keeps calling a
+cheap endpoint, and reports that endpoint's latency. The "before" app is
+the previous handler (FastAPI form parsing, file.read(), synchronous
+open().write() per file); the "after" app is the streaming handler with
+writes on the upload thread pool. Both run in-process on one event loop,
+so anything that blocks the loop shows up as ping latency.
+
+Writes to the page cache are fast, so a second pass adds a simulated
+write cost per MB (as on a network volume or a busy disk) to both
+handlers' file writes.
+
+The "after" handler records images in MongoDB, so MONGO_URL must point at a
+server; a scratch upload_benchmark database is used and dropped.
+
+Usage: python benchmarks/upload_benchmark.py [rounds] [image_mb] [slow_disk_ms_per_mb]
+"""
+
+import asyncio
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Uploads land in ./uploads; keep them out of the real upload directory
+os.chdir(tempfile.mkdtemp(prefix="upload-benchmark-"))
+
+import httpx
+from PIL import Image
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import uploads
+from database import Database
+from server import app
+
+BENCHMARK_DB = "upload_benchmark"
+
+# Simulated storage cost in seconds per MB written, set per pass by main()
+WRITE_COST = {"seconds_per_mb": 0.0}
+
+
+def slow_disk(data: bytes):
+    """Block the calling thread as a slow disk write would"""
+    if WRITE_COST["seconds_per_mb"]:
+        time.sleep(len(data) / (1024 * 1024) * WRITE_COST["seconds_per_mb"])
+
+
+_part_write = uploads._Part.write
+
+
+def slow_part_write(part, data: bytes):
+    _part_write(part, data)
+    slow_disk(data)
+
+
+uploads._Part.write = slow_part_write
+
+
+def legacy_app() -> FastAPI:
+    """The upload handler as it was before streaming and off-loop writes"""
+    legacy = FastAPI()
+    upload_dir = Path("uploads-legacy")
+    upload_dir.mkdir(exist_ok=True)
+
+    @legacy.get("/api/")
+    async def health_check():
+        return {"status": "healthy"}
+
+    @legacy.post("/api/upload/images")
+    async def upload_multiple_images(files: List[UploadFile] = File(...)):
+        if len(files) > 10:
+            raise HTTPException(status_code=400, detail="Maximum 10 images allowed per upload")
+        uploaded_files = []
+        for file in files:
+            content = await file.read()
+            if len(content) > 5 * 1024 * 1024:
+                continue
+            unique_filename = f"{uuid.uuid4()}{os.path.splitext(file.filename)[1].lower()}"
+            with open(upload_dir / unique_filename, "wb") as buffer:
+                buffer.write(content)
+                slow_disk(content)
+            uploaded_files.append(unique_filename)
+            await file.seek(0)
+        return {"upload_count": len(uploaded_files)}
+
+    return legacy
+
+
+async def pinger(client: httpx.AsyncClient, stop: asyncio.Event, latencies: List[float]):
+    """Ping every 2 ms; latency runs from when the ping was due, so time the
+    loop spent blocked before it could even start the request counts too"""
+    while not stop.is_set():
+        due = time.perf_counter() + 0.002
+        await asyncio.sleep(0.002)
+        await client.get("/api/")
+        latencies.append(time.perf_counter() - due)
+
+
+async def run(name: str, target: FastAPI, images: List[bytes], rounds: int):
+    transport = httpx.ASGITransport(app=target)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        stop = asyncio.Event()
+        latencies: List[float] = []
+        ping = asyncio.create_task(pinger(client, stop, latencies))
+
+        upload_times = []
+        for _ in range(rounds):
+            # File objects make httpx send the body in chunks, like a real client
+            files = [("files", (f"image-{i}.jpg", io.BytesIO(data), "image/jpeg")) for i, data in enumerate(images)]
+            start = time.perf_counter()
+            response = await client.post("/api/upload/images", files=files)
+            upload_times.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.text
+
+        stop.set()
+        await ping
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(
+        f"{name:<8} upload {statistics.mean(upload_times) * 1000:7.1f} ms   "
+        f"ping p50 {statistics.median(latencies) * 1000:6.2f} ms   p99 {p99 * 1000:6.2f} ms   "
+        f"max {latencies[-1] * 1000:7.2f} ms   ({len(latencies)} pings)"
+    )
+
+
+def make_image(size: int) -> bytes:
+    """A real JPEG padded with random bytes to ``size``: uploads are identified by their header"""
+    header = io.BytesIO()
+    Image.new("RGB", (8, 8)).save(header, format="JPEG")
+    return header.getvalue() + os.urandom(size - header.tell())
+
+
+async def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    image_mb = float(sys.argv[2]) if len(sys.argv) > 2 else 4.5
+    images = [make_image(int(image_mb * 1024 * 1024)) for _ in range(10)]
+
+    slow_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 20.0
+
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    Database.db = client[BENCHMARK_DB]
+
+    print(f"10 x {image_mb} MB images, {rounds} uploads, GET /api/ pinged throughout\n")
+    try:
+        for label, cost in (("page cache", 0.0), (f"slow disk, {slow_ms:.0f} ms/MB", slow_ms / 1000)):
+            WRITE_COST["seconds_per_mb"] = cost
+            print(label)
+            await run("before", legacy_app(), images, rounds)
+            await run("after", app, images, rounds)
+            print()
+    finally:
+        await client.drop_database(BENCHMARK_DB)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
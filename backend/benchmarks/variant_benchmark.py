@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Image variant benchmark
+Renders the variants of existing uploads and compares the bytes a product
+listing downloads per image (the original, before) with the card variant
+in each format (after), along with how long rendering takes.
+
+Usage: python benchmarks/variant_benchmark.py [image ...]  (defaults to uploads/*)
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import image_variants
+
+
+def main():
+    backend = Path(__file__).resolve().parent.parent
+    images = [Path(arg) for arg in sys.argv[1:]] or sorted(
+        path for path in (backend / "uploads").iterdir() if path.is_file() and not path.name.startswith(".")
+    )
+    # Variants of the benchmark are written to a scratch directory
+    image_variants.VARIANT_DIR = Path(tempfile.mkdtemp(prefix="variant-benchmark-"))
+
+    totals = {"original": 0, "card webp": 0, "card jpeg": 0, "thumb webp": 0}
+    render_times = []
+    for path in images:
+        start = time.perf_counter()
+        image_variants.render_variants(str(path), path.name)
+        render_times.append(time.perf_counter() - start)
+        sizes = {
+            "original": path.stat().st_size,
+            "card webp": image_variants.variant_path(path.name, "card", "webp").stat().st_size,
+            "card jpeg": image_variants.variant_path(path.name, "card", "jpeg").stat().st_size,
+            "thumb webp": image_variants.variant_path(path.name, "thumb", "webp").stat().st_size,
+        }
+        for key, size in sizes.items():
+            totals[key] += size
+        print(f"{path.name:<44} " + "   ".join(f"{key} {size / 1024:7.1f} KB" for key, size in sizes.items()))
+
+    print()
+    for key, size in totals.items():
+        print(f"{key:<12} {size / 1024:9.1f} KB total   {totals['original'] / size:5.1f}x smaller than originals")
+    print(f"\nrendering {len(images)} images: {sum(render_times) * 1000 / len(images):.0f} ms per image (all variants, one process)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Collections served from memory. They change rarely (a few times a week) but
+# are read on every page view.
+CATALOG_COLLECTIONS = ("company_info", "product_categories", "products", "testimonials", "advantages")
+
+# Error code returned by mongod when change streams are used without a replica set
+CHANGE_STREAM_UNSUPPORTED = 40573
+
+Loader = Callable[[], Awaitable[Any]]
+
+
+class CatalogCache:
+    """Read-through cache for the catalog collections.
+
+    Entries are keyed by collection and an arbitrary hashable key (usually the
+    query parameters of the route). When a collection changes, every entry of
+    that collection is reloaded with the loader that produced it, so hot keys
+    never fall back to Mongo on the request path.
+    """
+
+    def __init__(self, collections: Iterable[str], poll_interval: float = 30.0):
+        self.collections = tuple(collections)
+        self.poll_interval = poll_interval
+        self.mode = "disabled"
+        self._entries: Dict[str, Dict[Hashable, Any]] = {name: {} for name in self.collections}
+        self._loaders: Dict[Tuple[str, Hashable], Loader] = {}
+        self._locks: Dict[Tuple[str, Hashable], asyncio.Lock] = {}
+        self._generations: Dict[str, int] = {name: 0 for name in self.collections}
+        self._stats: Dict[str, Dict[str, int]] = {
+            name: {"hits": 0, "misses": 0, "refreshes": 0} for name in self.collections
+        }
+        self._task: Optional[asyncio.Task] = None
+
+    async def get(self, collection: str, key: Hashable, loader: Loader) -> Any:
+        """Return the cached value for ``key``, loading it on first access"""
+        entries = self._entries[collection]
+        if key in entries:
+            self._stats[collection]["hits"] += 1
+            return entries[key]
+
+        lock = self._locks.setdefault((collection, key), asyncio.Lock())
+        async with lock:
+            # Another request may have filled the entry while we were waiting
+            if key in entries:
+                self._stats[collection]["hits"] += 1
+                return entries[key]
+
+            self._stats[collection]["misses"] += 1
+            self._loaders[(collection, key)] = loader
+            generation = self._generations[collection]
+            value = await loader()
+
+            # Do not store a value that was read before a concurrent change
+            if generation == self._generations[collection]:
+                entries[key] = value
+            return value
+
+    async def refresh(self, collection: str):
+        """Drop and reload every entry of ``collection``"""
+        if collection not in self._entries:
+            return
+
+        self._generations[collection] += 1
+        self._stats[collection]["refreshes"] += 1
+        self._entries[collection] = {}
+
+        generation = self._generations[collection]
+        loaders = [
+            (key, loader) for (name, key), loader in self._loaders.items()
+            if name == collection
+        ]
+        for key, loader in loaders:
+            try:
+                value = await loader()
+            except Exception as e:
+                logger.error(f"Failed to reload cache entry {collection}/{key}: {e}")
+                continue
+            if generation != self._generations[collection]:
+                # A newer change arrived while reloading; that refresh wins
+                return
+            self._entries[collection][key] = value
+
+    async def refresh_all(self):
+        for collection in self.collections:
+            await self.refresh(collection)
+
+    def stats(self) -> Dict[str, Any]:
+        collections = {
+            name: {**counters, "entries": len(self._entries[name])}
+            for name, counters in self._stats.items()
+        }
+        hits = sum(c["hits"] for c in collections.values())
+        misses = sum(c["misses"] for c in collections.values())
+        return {
+            "mode": self.mode,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None,
+            "collections": collections,
+        }
+
+    def start(self, db):
+        """Start invalidating entries on database changes"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch(db))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.mode = "disabled"
+
+    async def _watch(self, db):
+        pipeline = [{"$match": {"ns.coll": {"$in": list(self.collections)}}}]
+        while True:
+            try:
+                async with db.watch(pipeline) as stream:
+                    self.mode = "change_stream"
+                    logger.info("Catalog cache invalidated by change stream")
+                    async for change in stream:
+                        await self.refresh(change.get("ns", {}).get("coll"))
+            except OperationFailure as e:
+                if e.code == CHANGE_STREAM_UNSUPPORTED:
+                    logger.info(
+                        f"Change streams unavailable, polling catalog collections "
+                        f"every {self.poll_interval}s"
+                    )
+                    await self._poll(db)
+                    return
+                logger.error(f"Catalog cache change stream failed: {e}")
+            except PyMongoError as e:
+                logger.error(f"Catalog cache change stream interrupted: {e}")
+
+            # Changes may have been missed while the stream was down
+            self.mode = "reconnecting"
+            await asyncio.sleep(self.poll_interval)
+            await self.refresh_all()
+
+    async def _poll(self, db):
+        self.mode = "polling"
+        hashes = await self._collection_hashes(db) or {}
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            current = await self._collection_hashes(db)
+            if current is None:
+                # Without a fingerprint we cannot tell what changed
+                await self.refresh_all()
+                continue
+            for collection in self.collections:
+                if current.get(collection) != hashes.get(collection):
+                    await self.refresh(collection)
+            hashes = current
+
+    async def _collection_hashes(self, db) -> Optional[Dict[str, str]]:
+        try:
+            result = await db.command("dbHash", collections=list(self.collections))
+            return result.get("collections", {})
+        except PyMongoError as e:
+            logger.warning(f"Catalog cache poll failed: {e}")
+            return None
+
+
+catalog_cache = CatalogCache(
+    CATALOG_COLLECTIONS,
+    poll_interval=float(os.environ.get("CATALOG_CACHE_POLL_SECONDS", "30")),
+)
@@ -1,14 +1,20 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from typing import Optional, List, Dict, Any
+import asyncio
 import os
 from datetime import datetime
 import logging
 
+from indexes import reconcile_indexes
+from migrations import read_state, run_backfills, run_migrations
+
 logger = logging.getLogger(__name__)
 
 class Database:
     client: Optional[AsyncIOMotorClient] = None
     db = None
+    index_task: Optional[asyncio.Task] = None
+    backfill_task: Optional[asyncio.Task] = None
 
 def get_database() -> AsyncIOMotorClient:
     return Database.db
@@ -26,8 +32,12 @@ async def connect_to_mongo():
         await Database.client.admin.command('ping')
         logger.info("Successfully connected to MongoDB")
         
-        # Initialize collections and sample data
-        await initialize_database()
+        # Seed data and migrate documents written by older versions
+        state = await initialize_database()
+        
+        # Build any missing indexes and derived fields without holding up startup
+        Database.index_task = asyncio.create_task(reconcile_indexes(Database.db))
+        Database.backfill_task = asyncio.create_task(run_backfills(Database.db, state))
         
     except Exception as e:
         logger.error(f"Failed to connect to MongoDB: {e}")
@@ -35,159 +45,17 @@ async def connect_to_mongo():
 
 async def close_mongo_connection():
     """Close database connection"""
+    for task in (Database.index_task, Database.backfill_task):
+        if task and not task.done():
+            task.cancel()
     if Database.client:
         Database.client.close()
         logger.info("MongoDB connection closed")
 
-async def initialize_database():
-    """Initialize database with sample data if collections are empty"""
-    db = get_database()
-    
-    # Company Information
-    company_collection = db.company_info
-    # Always update to ensure latest contact info
-    await company_collection.delete_many({})  # Clear existing data
-    company_data = {
-            "name": "SUN STAR INTERNATIONAL FZ-LLC",
-            "license_no": "5034384",
-            "manager": "Daniel Abera Wakjira",
-            "tagline": "Driving Growth. Powering Construction.",
-            "mission": "To connect global markets with high-quality cars, spare parts, and heavy equipment.",
-            "values": ["Trust", "Reliability", "Speed"],
-            "address": {
-                "building": "VVIPR1315, Compass building - Al Hulaila",
-                "zone": "AL Hulaila Industrial Zone-FZ",
-                "city": "RAK UAE",
-                "country": "United Arab Emirates"
-            },
-            "contact": {
-                "phoneUAE": "+971551849702",
-                "phoneEthiopia": "+251-911373857",
-                "email": "sunstarintl.ae@gmail.com",
-                "whatsapp": "+971551849702"
-            },
-            "license": {
-                "issueDate": "11-08-2025",
-                "expiryDate": "10-08-2026",
-                "authority": "RAKEZ"
-            },
-            "created_at": datetime.utcnow(),
-            "updated_at": datetime.utcnow()
-        }
-    await company_collection.insert_one(company_data)
-    logger.info("Company information initialized")
-
-    # Product Categories
-    categories_collection = db.product_categories
-    if await categories_collection.count_documents({}) == 0:
-        categories_data = [
-            {
-                "id": "1",
-                "name": "New Passenger Motor Vehicles",
-                "description": "High-quality new passenger cars from trusted global manufacturers",
-                "image": "https://images.unsplash.com/photo-1601929862217-f1bf94503333?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2NjZ8MHwxfHNlYXJjaHwxfHxsdXh1cnklMjBjYXJzfGVufDB8fHxibHVlfDE3NTY3NTU3NjJ8MA&ixlib=rb-4.1.0&q=85",
-                "products": ["Sedans", "SUVs", "Hatchbacks", "Luxury Vehicles"],
-                "created_at": datetime.utcnow()
-            },
-            {
-                "id": "2", 
-                "name": "Auto Spare Parts & Components",
-                "description": "Comprehensive range of automotive parts and components",
-                "image": "https://images.unsplash.com/photo-1595787142948-569014817b2f?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDk1ODB8MHwxfHNlYXJjaHw0fHxhdXRvbW90aXZlJTIwYnVzaW5lc3N8ZW58MHx8fGJsdWV8MTc1Njc1NTc1Nnww&ixlib=rb-4.1.0&q=85",
-                "products": ["Engines", "Transmissions", "Body Parts", "Electrical Components"],
-                "created_at": datetime.utcnow()
-            },
-            {
-                "id": "3",
-                "name": "Heavy Equipment & Machinery Spare Parts",
-                "description": "Durable spare parts for heavy machinery and construction equipment",
-                "image": "https://images.unsplash.com/photo-1714765445826-582769cf22ff?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2Nzh8MHwxfHNlYXJjaHw0fHxoZWF2eSUyMG1hY2hpbmVyeXxlbnwwfHx8Ymx1ZXwxNzU2NzU1NzgxfDA&ixlib=rb-4.1.0&q=85",
-                "products": ["Hydraulic Parts", "Engine Components", "Tracks & Tires", "Filters & Fluids"],
-                "created_at": datetime.utcnow()
-            },
-            {
-                "id": "4",
-                "name": "Construction Equipment & Machinery",
-                "description": "Professional construction machinery for all your project needs",
-                "image": "https://images.unsplash.com/photo-1655048424706-bc5e4fc9f6b5?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2Nzh8MHwxfHNlYXJjaHwxfHxoZWF2eSUyMG1hY2hpbmVyeXxlbnwwfHx8Ymx1ZXwxNzU2NzU1NzgxfDA&ixlib=rb-4.1.0&q=85",
-                "products": ["Excavators", "Bulldozers", "Cranes", "Loaders", "Concrete Mixers"],
-                "created_at": datetime.utcnow()
-            }
-        ]
-        await categories_collection.insert_many(categories_data)
-        logger.info("Product categories initialized")
-
-    # Testimonials
-    testimonials_collection = db.testimonials
-    if await testimonials_collection.count_documents({}) == 0:
-        testimonials_data = [
-            {
-                "name": "Ahmed Al-Rashid",
-                "company": "Al-Rashid Construction",
-                "text": "Sun Star International provided us with excellent construction equipment. Their professionalism and quick delivery exceeded our expectations.",
-                "rating": 5,
-                "is_featured": True,
-                "is_active": True,
-                "created_at": datetime.utcnow()
-            },
-            {
-                "name": "Mohammed Hassan",
-                "company": "Hassan Auto Trading",
-                "text": "The quality of spare parts and competitive pricing makes Sun Star our preferred supplier for automotive components.",
-                "rating": 5,
-                "is_featured": True,
-                "is_active": True,
-                "created_at": datetime.utcnow()
-            },
-            {
-                "name": "Sarah Williams",
-                "company": "International Logistics Ltd",
-                "text": "Reliable partner for our equipment needs across the Middle East. Professional service and quality products.",
-                "rating": 5,
-                "is_featured": True,
-                "is_active": True,
-                "created_at": datetime.utcnow()
-            }
-        ]
-        await testimonials_collection.insert_many(testimonials_data)
-        logger.info("Testimonials initialized")
-
-    # Advantages (Why Choose Us)
-    advantages_collection = db.advantages
-    if await advantages_collection.count_documents({}) == 0:
-        advantages_data = [
-            {
-                "title": "UAE Freezone Licensed Company (RAKEZ)",
-                "description": "Fully licensed and regulated by Ras Al Khaimah Economic Zone",
-                "icon": "Shield",
-                "order": 1,
-                "is_active": True,
-                "created_at": datetime.utcnow()
-            },
-            {
-                "title": "Global Export & Shipping",
-                "description": "Worldwide delivery with reliable logistics partners",
-                "icon": "Globe",
-                "order": 2,
-                "is_active": True,
-                "created_at": datetime.utcnow()
-            },
-            {
-                "title": "Wide Product Range",
-                "description": "Comprehensive inventory from cars to heavy machinery",
-                "icon": "Package",
-                "order": 3,
-                "is_active": True,
-                "created_at": datetime.utcnow()
-            },
-            {
-                "title": "Reliable Sourcing & Fast Delivery",
-                "description": "Trusted suppliers and efficient delivery systems",
-                "icon": "Truck",
-                "order": 4,
-                "is_active": True,
-                "created_at": datetime.utcnow()
-            }
-        ]
-        await advantages_collection.insert_many(advantages_data)
-        logger.info("Advantages initialized")
\ No newline at end of file
+async def initialize_database() -> Dict[str, Any]:
+    """Apply pending seed and data migrations, returning the migration state read beforehand"""
+    state = await read_state(get_database())
+    applied = await run_migrations(get_database(), state)
+    if applied:
+        logger.info(f"Applied {applied} database migrations")
+    return state
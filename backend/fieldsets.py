@@ -0,0 +1,63 @@
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple, Type
+
+from fastapi import HTTPException
+from pydantic import BaseModel, create_model
+
+from models import INTERNAL_FIELDS, schema_version
+
+
+@lru_cache(maxsize=256)
+def reduced_model(model_cls: Type[BaseModel], fields: Tuple[str, ...]) -> Type[BaseModel]:
+    """Model with only ``fields`` of ``model_cls``, keeping their types and defaults"""
+    definitions = {name: (model_cls.model_fields[name].annotation, model_cls.model_fields[name]) for name in fields}
+    model = create_model(f"{model_cls.__name__}Fields", **definitions)
+    # Projections of trusted documents are trusted too
+    model.SCHEMA_VERSION = schema_version(model_cls)
+    return model
+
+
+class Fieldset:
+    """Sparse fieldset requested with ?fields=name,price,...
+
+    Turns the requested fields into a Mongo projection and a reduced model for
+    validating legacy documents. ``always`` fields (e.g. the pagination sort
+    key) are fetched even when not requested and dropped again by select().
+    """
+
+    def __init__(self, model_cls: Type[BaseModel], fields: Optional[str], always: Tuple[str, ...] = ()):
+        self.fields: Optional[Tuple[str, ...]] = None
+        self.model = model_cls
+
+        requested = tuple(dict.fromkeys(f.strip() for f in (fields or "").split(",") if f.strip()))
+        if not requested:
+            return
+
+        unknown = [name for name in requested if name not in model_cls.model_fields]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(model_cls.model_fields)}"
+            )
+
+        self.fields = requested
+        self._fetched = tuple(dict.fromkeys(requested + always))
+        self.model = reduced_model(model_cls, self._fetched)
+
+    @property
+    def projection(self) -> Dict[str, int]:
+        if not self.fields:
+            return {"_id": 0, **{name: 0 for name in INTERNAL_FIELDS}}
+        # schema_version decides whether the document can skip validation
+        return {"_id": 0, "schema_version": 1, **{name: 1 for name in self._fetched}}
+
+    def select(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        if not self.fields:
+            return document
+        return {name: document[name] for name in self.fields if name in document}
+
+    def select_model(self, model: Any) -> Any:
+        """Apply the fieldset to an already-built model (catalog cache data)"""
+        if not self.fields:
+            return model
+        return model.model_dump(include=set(self.fields))
@@ -0,0 +1,190 @@
+import os
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+# Files are read in chunks of this size when the server can't send them itself
+FILE_CHUNK_SIZE = 256 * 1024
+
+# Small images requested this often are kept in memory, up to a total size
+HOT_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_MEMORY_CACHE_MB", "32")) * 1024 * 1024
+HOT_CACHE_MAX_FILE_BYTES = int(os.environ.get("IMAGE_MEMORY_CACHE_MAX_FILE_KB", "512")) * 1024
+HOT_CACHE_ADMIT_AFTER = int(os.environ.get("IMAGE_MEMORY_CACHE_ADMIT_AFTER", "2"))
+
+# Per-file metrics are kept for at most this many files
+MAX_TRACKED_FILES = 10000
+
+
+async def read_range(path: str, start: int, end: int) -> AsyncIterator[bytes]:
+    async with await anyio.open_file(path, "rb") as file:
+        await file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await file.read(min(FILE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class ZeroCopyFileResponse(Response):
+    """A file, or a byte range of one, handed to the server to send itself where it can.
+
+    Uses the ASGI zero-copy send extension (the server calls sendfile()
+    on the open file) or the path send extension when the server offers
+    one, and otherwise streams the file in FILE_CHUNK_SIZE reads. Uvicorn
+    offers neither, so under uvicorn every file is streamed in chunks;
+    only memory-cached files skip the disk read.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        media_type: str,
+        headers: Dict[str, str],
+        status_code: int = 200,
+        offset: int = 0,
+        count: Optional[int] = None,
+        size: int = 0,
+    ):
+        self.path = path
+        self.offset = offset
+        self.count = size - offset if count is None else count
+        self.whole = offset == 0 and self.count == size
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        self.init_headers({**headers, "Content-Length": str(self.count)})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        extensions = scope.get("extensions") or {}
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope.get("method") == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif "http.response.zerocopysend" in extensions:
+            file = await anyio.to_thread.run_sync(open, self.path, "rb")
+            try:
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file,
+                    "offset": self.offset,
+                    "count": self.count,
+                    "more_body": False,
+                })
+            finally:
+                file.close()
+        elif "http.response.pathsend" in extensions and self.whole:
+            await send({"type": "http.response.pathsend", "path": os.path.abspath(self.path)})
+        else:
+            async for chunk in read_range(self.path, self.offset, self.offset + self.count - 1):
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+class HotFile:
+    __slots__ = ("path", "body", "stat_result")
+
+    def __init__(self, path: str, body: bytes, stat_result: os.stat_result):
+        self.path = path
+        self.body = body
+        self.stat_result = stat_result
+
+
+class HotFileCache:
+    """Small, frequently requested files kept in memory, least recently used out first.
+
+    A file is only admitted on its HOT_CACHE_ADMIT_AFTER-th request, so
+    one-off requests don't push out the images carrying the traffic. Files
+    can be deleted by another worker process, whose invalidate() never
+    reaches this cache, so callers check the file on disk still matches an
+    entry's stat before serving it, and discard() it otherwise.
+    """
+
+    def __init__(self, max_bytes: int, max_file_bytes: int, admit_after: int):
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.admit_after = admit_after
+        self.entries: "OrderedDict[str, HotFile]" = OrderedDict()
+        self.total = 0
+        self._requests: Dict[str, int] = {}
+
+    def get(self, path: str) -> Optional[HotFile]:
+        entry = self.entries.get(path)
+        if entry is not None:
+            self.entries.move_to_end(path)
+        return entry
+
+    def wants(self, path: str, size: int) -> bool:
+        """Count a miss, and say whether the file should now be cached"""
+        if not self.max_bytes or size > self.max_file_bytes:
+            return False
+        if len(self._requests) >= MAX_TRACKED_FILES:
+            self._requests.clear()
+        self._requests[path] = self._requests.get(path, 0) + 1
+        return self._requests[path] >= self.admit_after
+
+    def put(self, path: str, entry: HotFile):
+        self._requests.pop(path, None)
+        previous = self.entries.pop(path, None)
+        if previous is not None:
+            self.total -= len(previous.body)
+        self.entries[path] = entry
+        self.total += len(entry.body)
+        while self.total > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.total -= len(evicted.body)
+
+    def discard(self, path: str):
+        entry = self.entries.pop(path, None)
+        if entry is not None:
+            self.total -= len(entry.body)
+
+    def invalidate(self, filename: str):
+        """Drop an upload and its variants (named <stem>.*)"""
+        stem = os.path.splitext(filename)[0]
+        for path in [path for path in self.entries if os.path.basename(path).startswith(stem)]:
+            self.total -= len(self.entries.pop(path).body)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self.entries), "bytes": self.total, "max_bytes": self.max_bytes}
+
+
+class FileHitMetrics:
+    """Requests per served file and how they were answered"""
+
+    def __init__(self):
+        # name -> [requests, memory hits, not modified, bytes sent]
+        self.files: Dict[str, List[int]] = {}
+
+    def record(self, name: str, memory: bool, not_modified: bool, sent: int):
+        counts = self.files.get(name)
+        if counts is None:
+            if len(self.files) >= MAX_TRACKED_FILES:
+                # Forget the least requested half
+                keep = sorted(self.files.items(), key=lambda item: item[1][0], reverse=True)[:MAX_TRACKED_FILES // 2]
+                self.files = dict(keep)
+            counts = self.files[name] = [0, 0, 0, 0]
+        counts[0] += 1
+        counts[1] += memory
+        counts[2] += not_modified
+        counts[3] += sent
+
+    def top(self, limit: int) -> List[Dict[str, Any]]:
+        busiest = sorted(self.files.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        return [
+            {
+                "file": name,
+                "requests": requests,
+                "memory_hit_rate": round(memory / requests, 3),
+                "not_modified": not_modified,
+                "bytes_sent": sent,
+            }
+            for name, (requests, memory, not_modified, sent) in busiest
+        ]
+
+
+hot_files = HotFileCache(HOT_CACHE_MAX_BYTES, HOT_CACHE_MAX_FILE_BYTES, HOT_CACHE_ADMIT_AFTER)
+file_metrics = FileHitMetrics()
@@ -0,0 +1,225 @@
+import asyncio
+import hashlib
+import os
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import anyio
+from fastapi import HTTPException, Request, Response
+
+from file_serving import HotFile, ZeroCopyFileResponse, file_metrics, hot_files
+from serialization import dumps
+
+
+class CachePolicy:
+    """Cache-Control directives for a group of public endpoints"""
+
+    def __init__(self, max_age: int, stale_while_revalidate: int = 0, public: bool = True, immutable: bool = False):
+        self.max_age = max_age
+        self.stale_while_revalidate = stale_while_revalidate
+        self.public = public
+        self.immutable = immutable
+
+    @property
+    def header(self) -> str:
+        directives = ["public" if self.public else "private", f"max-age={self.max_age}"]
+        if self.stale_while_revalidate:
+            directives.append(f"stale-while-revalidate={self.stale_while_revalidate}")
+        if self.immutable:
+            directives.append("immutable")
+        return ", ".join(directives)
+
+
+# Catalog data changes a few times a week; ratings change whenever a customer submits one
+CATALOG_CACHE_POLICY = CachePolicy(
+    max_age=int(os.environ.get("CATALOG_CACHE_MAX_AGE", "300")),
+    stale_while_revalidate=int(os.environ.get("CATALOG_CACHE_SWR", "86400")),
+)
+# Ratings carry the customer's email and IP address, so only the client may
+# keep them; CDNs and proxies must not
+RATINGS_CACHE_POLICY = CachePolicy(
+    max_age=int(os.environ.get("RATINGS_CACHE_MAX_AGE", "60")),
+    stale_while_revalidate=int(os.environ.get("RATINGS_CACHE_SWR", "600")),
+    public=False,
+)
+# Bytes under an upload URL never change: originals are named by their
+# content (or a random UUID), variants and transforms by their parameters
+IMAGE_CACHE_POLICY = CachePolicy(max_age=31536000, immutable=True)
+# A variant URL answered with the original until the variant is rendered
+PENDING_IMAGE_CACHE_POLICY = CachePolicy(max_age=60)
+
+# Served files are user uploads: even if one were opened as a document,
+# it may not run scripts or load anything on this origin
+FILE_CONTENT_SECURITY_POLICY = "default-src 'none'; sandbox"
+
+
+class RenderedResponse:
+    """JSON body encoded once, together with its strong ETag"""
+
+    __slots__ = ("data", "body", "etag")
+
+    def __init__(self, data: Any, body: bytes):
+        self.data = data
+        self.body = body
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def render(data: Any) -> RenderedResponse:
+    return RenderedResponse(data, dumps(data))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison as required for If-None-Match (RFC 9110 13.1.2)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def cached_response(
+    request: Request,
+    rendered: RenderedResponse,
+    policy: CachePolicy,
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """Build a 200 or 304 response carrying validators and Cache-Control"""
+    headers = {**(headers or {}), "ETag": rendered.etag, "Cache-Control": policy.header}
+    if etag_matches(request.headers.get("if-none-match"), rendered.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=rendered.body, media_type="application/json", headers=headers)
+
+
+def file_etag(stat_result: os.stat_result) -> str:
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def not_modified(request: Request, etag: str, mtime: float) -> bool:
+    """If-None-Match, or failing that If-Modified-Since (RFC 9110 13.2.2)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    try:
+        since = parsedate_to_datetime(request.headers["if-modified-since"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return False
+    return int(mtime) <= since
+
+
+def byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """First and last byte of a single-range request, or None to send everything"""
+    unit, _, spec = header.partition("=")
+    # Multiple ranges are allowed to be answered with the whole file
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # Suffix range: the final N bytes
+            start, end = size - int(last), size - 1
+    except ValueError:
+        return None
+    if start < 0:
+        start = 0
+    if start >= size or end < start:
+        raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, min(end, size - 1)
+
+
+def _same_file(cached: os.stat_result, current: os.stat_result) -> bool:
+    return (cached.st_ino, cached.st_mtime_ns, cached.st_size) == (current.st_ino, current.st_mtime_ns, current.st_size)
+
+
+def _stat_first(paths: List[str]) -> Tuple[str, os.stat_result]:
+    """The first of paths that is a regular file, with its stat"""
+    for path in paths:
+        try:
+            stat_result = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if stat.S_ISREG(stat_result.st_mode):
+            return path, stat_result
+    raise FileNotFoundError(paths[0])
+
+
+async def file_response(
+    request: Request,
+    path: "os.PathLike[str]",
+    media_type: str,
+    policy: CachePolicy,
+    etag: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None,
+    fallbacks: Sequence["os.PathLike[str]"] = (),
+) -> Response:
+    """Serve a file with validators, 304s and single byte ranges.
+
+    When path is missing, fallbacks are tried in order.
+
+    Hot small files come from memory; everything else is handed to
+    ZeroCopyFileResponse, which streams it in chunks unless the server
+    offers a zero-copy send (uvicorn does not).
+    """
+    candidates = [str(candidate) for candidate in (path, *fallbacks)]
+    # The file is stat'ed even when it is in memory: another worker may have
+    # deleted or replaced it, and only that worker's cache was invalidated
+    try:
+        path, stat_result = await asyncio.to_thread(_stat_first, candidates)
+    except FileNotFoundError:
+        for candidate in candidates:
+            hot_files.discard(candidate)
+        raise HTTPException(status_code=404, detail="File not found")
+    hot = hot_files.get(path)
+    if hot is not None and not _same_file(hot.stat_result, stat_result):
+        hot_files.discard(path)
+        hot = None
+    size = stat_result.st_size
+    name = os.path.basename(path)
+
+    etag = etag or file_etag(stat_result)
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+    headers = {
+        **(headers or {}),
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": policy.header,
+        "Accept-Ranges": "bytes",
+        "X-Content-Type-Options": "nosniff",
+        "Content-Security-Policy": FILE_CONTENT_SECURITY_POLICY,
+    }
+    if not_modified(request, etag, stat_result.st_mtime):
+        file_metrics.record(name, hot is not None, True, 0)
+        return Response(status_code=304, headers=headers)
+
+    start, end, status_code = 0, size - 1, 200
+    requested = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # A range only applies to the representation the client already has part of
+    if requested and (if_range is None or if_range in (etag, last_modified)):
+        selected = byte_range(requested, size)
+        if selected is not None:
+            start, end = selected
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    if hot is None and hot_files.wants(path, size):
+        body = await anyio.Path(path).read_bytes()
+        hot = HotFile(path, body, stat_result)
+        hot_files.put(path, hot)
+    file_metrics.record(name, hot is not None, False, end - start + 1)
+
+    if hot is not None:
+        return Response(content=hot.body[start:end + 1], status_code=status_code, media_type=media_type, headers=headers)
+    return ZeroCopyFileResponse(
+        path, media_type, headers, status_code=status_code, offset=start, count=end - start + 1, size=size
+    )
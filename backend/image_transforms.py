@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from image_variants import FORMATS, choose_format, prepare, run_in_pool, save
+from uploads import UPLOAD_DIR
+
+# Rendered transforms, named by a hash of the source and parameters
+TRANSFORM_CACHE_DIR = UPLOAD_DIR / "cache"
+TRANSFORM_CACHE_DIR.mkdir(exist_ok=True)
+# Least recently served renders are deleted past this total size
+TRANSFORM_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_TRANSFORM_CACHE_MB", "256")) * 1024 * 1024
+# Renders running at once, and waiting behind them before new ones get a 503
+TRANSFORM_CONCURRENCY = int(os.environ.get("IMAGE_TRANSFORM_CONCURRENCY", "2"))
+TRANSFORM_QUEUE = int(os.environ.get("IMAGE_TRANSFORM_QUEUE", "32"))
+
+MAX_DIMENSION = 2400
+FITS = ("cover", "contain", "fill")
+TRANSFORM_FORMATS = {
+    **FORMATS,
+    "png": (".png", "image/png", {"format": "PNG", "optimize": True}),
+}
+
+
+class TransformCache:
+    """Size-bounded LRU of rendered transforms on disk.
+
+    Recency is tracked in memory; on startup the files already on disk are
+    adopted oldest first by modification time.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, int]" = OrderedDict()
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+        self._loaded = False
+
+    def _scan(self):
+        files = [
+            (entry.stat().st_mtime, entry.name, entry.stat().st_size)
+            for entry in os.scandir(self.directory)
+            if entry.is_file() and not entry.name.startswith(".")
+        ]
+        return sorted(files)
+
+    async def load(self):
+        if self._loaded:
+            return
+        files = await asyncio.to_thread(self._scan)
+        if self._loaded:
+            return
+        for _, name, size in files:
+            self.entries[name] = size
+            self.total += size
+        self._loaded = True
+        await self.evict()
+
+    def get(self, name: str) -> Optional[Path]:
+        if name not in self.entries:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(name)
+        self.hits += 1
+        return self.directory / name
+
+    async def add(self, name: str, size: int):
+        self.total += size - self.entries.pop(name, 0)
+        self.entries[name] = size
+        await self.evict()
+
+    async def evict(self):
+        doomed = []
+        # The newest entry stays even if it alone is over the limit
+        while self.total > self.max_bytes and len(self.entries) > 1:
+            name, size = self.entries.popitem(last=False)
+            self.total -= size
+            doomed.append(self.directory / name)
+        if doomed:
+            await asyncio.to_thread(lambda: [path.unlink(missing_ok=True) for path in doomed])
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self.entries), "bytes": self.total, "hits": self.hits, "misses": self.misses}
+
+
+transform_cache = TransformCache(TRANSFORM_CACHE_DIR, TRANSFORM_CACHE_MAX_BYTES)
+_renders = asyncio.Semaphore(TRANSFORM_CONCURRENCY)
+_waiting = 0
+# Renders in flight by cache name, so identical requests share one
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+def render_transform(
+    source: str, target: str, width: Optional[int], height: Optional[int], fit: str, quality: int, image_format: str
+) -> int:
+    """Resize one upload and write it to the cache; runs in a worker process"""
+    with Image.open(source) as image:
+        image = prepare(image, (width or MAX_DIMENSION, height or MAX_DIMENSION))
+        if width and height:
+            if fit == "cover":
+                image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+            elif fit == "contain":
+                image = ImageOps.contain(image, (width, height), Image.LANCZOS)
+            else:
+                image = image.resize((width, height), Image.LANCZOS)
+        else:
+            # One side given: scale to it, keeping the aspect ratio, never enlarging
+            image.thumbnail((width or image.width, height or image.height), Image.LANCZOS)
+
+        options = dict(TRANSFORM_FORMATS[image_format][2])
+        if "quality" in options:
+            options["quality"] = quality
+        save(image, Path(target), options)
+    return os.path.getsize(target)
+
+
+async def _render(name: str, source: Path, width, height, fit, quality, image_format) -> Path:
+    global _waiting
+    if _waiting >= TRANSFORM_QUEUE:
+        raise HTTPException(status_code=503, detail="Image transforms are busy", headers={"Retry-After": "1"})
+    _waiting += 1
+    try:
+        await _renders.acquire()
+    finally:
+        _waiting -= 1
+    target = TRANSFORM_CACHE_DIR / name
+    try:
+        size = await run_in_pool(
+            render_transform, str(source), str(target), width, height, fit, quality, image_format
+        )
+    except UnidentifiedImageError:
+        raise HTTPException(status_code=415, detail="Image cannot be transformed")
+    finally:
+        _renders.release()
+    await transform_cache.add(name, size)
+    return target
+
+
+async def transform(
+    filename: str, source: Path, width: Optional[int], height: Optional[int], fit: str, quality: int,
+    image_format: str, accept: str
+) -> Tuple[Path, str]:
+    """The cached render of an upload (stored at source) for these parameters and its media type"""
+    if image_format == "auto":
+        image_format = choose_format(accept)
+    key = f"{filename}|{width}|{height}|{fit}|{quality}|{image_format}"
+    name = hashlib.sha256(key.encode()).hexdigest()[:32] + TRANSFORM_FORMATS[image_format][0]
+    media_type = TRANSFORM_FORMATS[image_format][1]
+
+    await transform_cache.load()
+    path = transform_cache.get(name)
+    if path is not None:
+        return path, media_type
+
+    if name not in _inflight:
+        future = asyncio.ensure_future(_render(name, source, width, height, fit, quality, image_format))
+        _inflight[name] = future
+        future.add_done_callback(lambda _: _inflight.pop(name, None))
+    # Shielded so one client disconnecting doesn't cancel the render for the others
+    return await asyncio.shield(_inflight[name]), media_type
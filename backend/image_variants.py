@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from uploads import UPLOAD_DIR, flat_path, locate, shard
+
+logger = logging.getLogger(__name__)
+
+# Resized copies of every upload, named <stem>.<variant>.<webp|jpg> and
+# sharded like the uploads themselves
+VARIANT_DIR = UPLOAD_DIR / "variants"
+VARIANT_DIR.mkdir(exist_ok=True)
+
+# Longest side in pixels; images smaller than a variant are never enlarged
+VARIANTS = {
+    "thumb": 200,
+    "card": 480,
+    "full": 1600,
+}
+
+# Served format -> (file extension, media type, Pillow save options)
+FORMATS = {
+    "webp": (".webp", "image/webp", {"format": "WEBP", "quality": 80, "method": 4}),
+    "jpeg": (".jpg", "image/jpeg", {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True}),
+}
+
+# Decoding and resizing is CPU bound, so it runs in worker processes rather
+# than threads; created on first use so importing this module stays cheap.
+# On-demand transforms (image_transforms.py) share the same pool. Workers are
+# spawned, not forked: forking a server already running threads (Motor, the
+# upload writers) can copy a held lock into the child and deadlock it.
+VARIANT_WORKERS = int(os.environ.get("IMAGE_VARIANT_WORKERS", "2"))
+_pool: Optional[ProcessPoolExecutor] = None
+# Generations in flight, so a burst of requests for one image renders it once
+_pending: Dict[str, asyncio.Future] = {}
+# Uploads Pillow could not decode (e.g. SVG); they are served as uploaded
+_failed: Set[str] = set()
+# Errors that will recur for the same file; anything else is retried on a later request
+DECODE_ERRORS = (UnidentifiedImageError, Image.DecompressionBombError, SyntaxError)
+
+
+def variant_path(filename: str, variant: str, image_format: str) -> Path:
+    stem = os.path.splitext(filename)[0]
+    return VARIANT_DIR / shard(filename) / f"{stem}.{variant}{FORMATS[image_format][0]}"
+
+
+def flat_variant_path(filename: str, variant: str, image_format: str) -> Path:
+    """Where a variant lived before sharding"""
+    return VARIANT_DIR / variant_path(filename, variant, image_format).name
+
+
+def prepare(image: Image.Image, box: Tuple[int, int]) -> Image.Image:
+    """Decode an opened image upright, as RGB or RGBA, at no less than box"""
+    # Lets JPEG decode at a reduced scale when the output is much smaller
+    image.draft("RGB", box)
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+    return image
+
+
+def save(image: Image.Image, path: Path, options: Dict[str, Any]):
+    """Encode to a temp file and rename, so readers never see a partial image"""
+    if options["format"] == "JPEG" and image.mode == "RGBA":
+        # JPEG has no alpha channel; flatten onto white
+        flat = Image.new("RGB", image.size, (255, 255, 255))
+        flat.paste(image, mask=image.getchannel("A"))
+        image = flat
+    temp_path = path.with_name(f".{path.name}.part")
+    image.save(temp_path, **options)
+    os.replace(temp_path, path)
+
+
+def render_variants(source: str, filename: str) -> List[str]:
+    """Write every variant of one upload; runs in a worker process"""
+    written = []
+    largest = max(VARIANTS.values())
+    with Image.open(source) as image:
+        image = prepare(image, (largest, largest))
+        for variant, size in sorted(VARIANTS.items(), key=lambda item: -item[1]):
+            # Each smaller variant is resized from the previous, larger one
+            image.thumbnail((size, size), Image.LANCZOS)
+            for image_format, (_, _, options) in FORMATS.items():
+                path = variant_path(filename, variant, image_format)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                save(image, path, options)
+                written.append(path.name)
+    return written
+
+
+def worker_pool() -> ProcessPoolExecutor:
+    """The process pool shared by all image work"""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=VARIANT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+async def run_in_pool(func, *args):
+    """Run func in the worker pool, replacing the pool if a worker died"""
+    global _pool
+    pool = worker_pool()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        # A worker was killed (e.g. out of memory on a huge image); a broken
+        # pool refuses all further work, so the next call starts a fresh one
+        if _pool is pool:
+            _pool = None
+            logger.error("Image worker process died, restarting the pool")
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+
+
+def _start(filename: str) -> asyncio.Future:
+    """The in-flight generation for an upload, starting one if needed"""
+    if filename in _pending:
+        return _pending[filename]
+
+    future = asyncio.ensure_future(
+        run_in_pool(render_variants, str(locate(filename) or flat_path(filename)), filename)
+    )
+    _pending[filename] = future
+    future.add_done_callback(lambda _: _pending.pop(filename, None))
+    return future
+
+
+def schedule_variants(filename: str):
+    """Start generating an upload's variants without waiting for them"""
+    if filename in _pending or filename in _failed:
+        return
+
+    def done(future: asyncio.Future):
+        if future.cancelled():
+            return
+        if future.exception():
+            if isinstance(future.exception(), DECODE_ERRORS):
+                _failed.add(filename)
+            logger.error(f"Failed to generate variants of {filename}: {future.exception()}")
+        else:
+            logger.info(f"Generated {len(future.result())} variants of {filename}")
+
+    _start(filename).add_done_callback(done)
+
+
+def choose_format(accept: str) -> str:
+    """WebP for clients that accept it, JPEG for everyone else"""
+    return "webp" if "image/webp" in accept.lower() else "jpeg"
+
+
+def find_variant(filename: str, variant: str, accept: str) -> Optional[Tuple[Path, str]]:
+    """The stored variant to serve for a request and its media type, or None if it isn't rendered yet"""
+    image_format = choose_format(accept)
+    for path in (variant_path(filename, variant, image_format), flat_variant_path(filename, variant, image_format)):
+        if path.exists():
+            return path, FORMATS[image_format][1]
+    return None
+
+
+def remove_variants(filename: str):
+    _failed.discard(filename)
+    for variant in VARIANTS:
+        for image_format in FORMATS:
+            flat_variant_path(filename, variant, image_format).unlink(missing_ok=True)
+            variant_path(filename, variant, image_format).unlink(missing_ok=True)
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
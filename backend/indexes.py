@@ -0,0 +1,189 @@
+import logging
+from typing import Any, Dict, List
+
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import PyMongoError
+
+from outbox import RETENTION_SECONDS
+
+logger = logging.getLogger(__name__)
+
+def _index(keys, name: str, **options) -> IndexModel:
+    # Background builds (a no-op since MongoDB 4.2, which never blocks the
+    # collection for the whole build) keep older servers serving traffic.
+    return IndexModel(keys, name=name, background=True, **options)
+
+
+# Declared indexes per collection. Every query issued by routes.py should be
+# served by one of these; index_usage_test.py checks that with explain().
+INDEXES: Dict[str, List[IndexModel]] = {
+    "admin_products": [
+        _index([("id", ASCENDING)], name="id_unique", unique=True),
+        # Keyset pagination sort key for /admin/products
+        _index([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_id"),
+        # Ranked search for /products/search; matches in the name count most
+        _index(
+            [("name", TEXT), ("description", TEXT)],
+            name="name_description_text",
+            weights={"name": 10, "description": 2},
+            default_language="english",
+        ),
+        # Part-number lookup: exact normalised key, then trigram candidates
+        _index([("part_number_key", ASCENDING)], name="part_number_key", sparse=True),
+        _index([("lookup_trigrams", ASCENDING)], name="lookup_trigrams"),
+        # Faceted filtering (/products/facets): equality filters first, price range last
+        _index(
+            [("category_id", ASCENDING), ("is_available", ASCENDING), ("is_featured", ASCENDING), ("price_amount", ASCENDING)],
+            name="category_available_featured_price",
+        ),
+        _index(
+            [("is_available", ASCENDING), ("is_featured", ASCENDING), ("price_amount", ASCENDING)],
+            name="available_featured_price",
+        ),
+        # Price ranges and sorts always come with a currency, and currency alone is a filter too
+        _index([("price_currency", ASCENDING), ("price_amount", ASCENDING)], name="price_currency_amount"),
+    ],
+    "products": [
+        _index([("category_id", ASCENDING)], name="category_id"),
+    ],
+    "inquiries": [
+        _index([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        _index(
+            [("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+            name="status_created_at_id",
+        ),
+    ],
+    "customer_ratings": [
+        _index([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        _index(
+            [("service_category", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+            name="service_category_created_at_id",
+        ),
+    ],
+    "testimonials": [
+        _index([("is_active", ASCENDING), ("is_featured", ASCENDING)], name="is_active_is_featured"),
+    ],
+    "advantages": [
+        _index([("is_active", ASCENDING), ("order", ASCENDING)], name="is_active_order"),
+    ],
+    "outbox": [
+        _index([("id", ASCENDING)], name="id_unique", unique=True),
+        # Claiming the oldest due message, and finding expired leases
+        _index([("status", ASCENDING), ("available_at", ASCENDING)], name="status_available_at"),
+        _index([("status", ASCENDING), ("lease_until", ASCENDING)], name="status_lease_until"),
+        # Digest batches: due messages of one kind, oldest first
+        _index([("kind", ASCENDING), ("status", ASCENDING), ("created_at", ASCENDING)], name="kind_status_created_at"),
+        # Delivered messages expire; pending and dead ones have no sent_at
+        _index([("sent_at", ASCENDING)], name="sent_at_ttl", expireAfterSeconds=RETENTION_SECONDS),
+    ],
+    "images": [
+        # Deduplicating uploads by content, and releasing them by file name
+        _index([("sha256", ASCENDING)], name="sha256_unique", unique=True),
+        _index([("filename", ASCENDING)], name="filename_unique", unique=True),
+    ],
+}
+
+
+# Options that change what an index does, compared with the declaration.
+# The rest (background, default_language, ...) are build or query defaults.
+COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression", "weights")
+
+
+def _same_keys(existing: Dict[str, Any], model: IndexModel) -> bool:
+    declared = list(model.document["key"].items())
+    if any(direction == TEXT for _, direction in declared):
+        # Text indexes are stored as _fts/_ftsx keys; the fields are in weights
+        text_fields = {field for field, direction in declared if direction == TEXT}
+        return set(existing.get("weights", {})) == text_fields
+    return [(field, direction) for field, direction in existing["key"]] == declared
+
+
+def _option(value: Any) -> Any:
+    # An option that is absent and one set to false mean the same; a TTL of 0 does not
+    return None if value is None or value is False else value
+
+
+def _changed_options(existing: Dict[str, Any], model: IndexModel) -> List[str]:
+    declared = {name: model.document.get(name) for name in COMPARED_OPTIONS}
+    text_fields = [field for field, direction in model.document["key"].items() if direction == TEXT]
+    if text_fields and declared["weights"] is None:
+        # The server stores the default weight of 1 for every text field
+        declared["weights"] = {field: 1 for field in text_fields}
+    return [name for name in COMPARED_OPTIONS if _option(existing.get(name)) != _option(declared[name])]
+
+
+async def reconcile_indexes(db, create: bool = True, drop_extra: bool = False) -> Dict[str, Any]:
+    """Bring the database indexes in line with INDEXES.
+
+    Missing indexes are created as background builds; indexes that exist but are not declared are reported, and dropped
+    only when ``drop_extra`` is set. A changed TTL is applied in place with
+    collMod (reported as outdated when not creating). An existing index whose
+    keys or other options differ from the declaration is reported as a
+    conflict and left untouched.
+    """
+    report: Dict[str, Any] = {
+        "created": [], "missing": [], "modified": [], "outdated": [], "extra": [], "dropped": [], "conflicts": [],
+        "errors": []
+    }
+
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        try:
+            existing = await collection.index_information()
+        except PyMongoError as e:
+            report["errors"].append({"collection": collection_name, "error": str(e)})
+            continue
+
+        declared = {model.document["name"]: model for model in models}
+        for name, model in declared.items():
+            if name in existing:
+                if not _same_keys(existing[name], model):
+                    report["conflicts"].append(f"{collection_name}.{name}: keys differ")
+                    continue
+                changed = _changed_options(existing[name], model)
+                ttl = model.document.get("expireAfterSeconds")
+                if changed == ["expireAfterSeconds"] and ttl is not None and "expireAfterSeconds" in existing[name]:
+                    change = f"{collection_name}.{name}: expireAfterSeconds {existing[name]['expireAfterSeconds']} -> {ttl}"
+                    if not create:
+                        report["outdated"].append(change)
+                        continue
+                    try:
+                        await db.command("collMod", collection_name, index={"name": name, "expireAfterSeconds": ttl})
+                        report["modified"].append(change)
+                        logger.info(f"Changed index {change}")
+                    except PyMongoError as e:
+                        report["errors"].append({"index": f"{collection_name}.{name}", "error": str(e)})
+                        logger.error(f"Failed to change index {change}: {e}")
+                elif changed:
+                    report["conflicts"].append(f"{collection_name}.{name}: {', '.join(changed)} differ")
+                continue
+
+            if not create:
+                report["missing"].append(f"{collection_name}.{name}")
+                continue
+            try:
+                await collection.create_indexes([model])
+                report["created"].append(f"{collection_name}.{name}")
+                logger.info(f"Created index {collection_name}.{name}")
+            except PyMongoError as e:
+                report["errors"].append({"index": f"{collection_name}.{name}", "error": str(e)})
+                logger.error(f"Failed to create index {collection_name}.{name}: {e}")
+
+        for name in existing:
+            if name == "_id_" or name in declared:
+                continue
+            if not drop_extra:
+                report["extra"].append(f"{collection_name}.{name}")
+                continue
+            try:
+                await collection.drop_index(name)
+                report["dropped"].append(f"{collection_name}.{name}")
+                logger.info(f"Dropped undeclared index {collection_name}.{name}")
+            except PyMongoError as e:
+                report["errors"].append({"index": f"{collection_name}.{name}", "error": str(e)})
+
+    if report["extra"]:
+        logger.warning(f"Undeclared indexes: {', '.join(report['extra'])}")
+    if report["conflicts"]:
+        logger.warning(f"Indexes differing from their declaration: {', '.join(report['conflicts'])}")
+    return report
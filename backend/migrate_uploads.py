@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Upload store migration for Sun Star International
+Moves uploads (and their resized variants) from the flat uploads/
+directory into the sharded uploads/ab/cd/ layout while the API keeps
+serving: every move is a single rename, and the API looks in both places
+until it is done. Safe to stop and re-run at any time.
+
+Usage: python migrate_uploads.py [--batch-size N] [--pause SECONDS] [--dry-run]
+"""
+
+import argparse
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+# Upload paths are relative to the API's working directory
+os.chdir(ROOT_DIR)
+
+from image_variants import VARIANT_DIR, VARIANTS
+from uploads import UPLOAD_DIR, shard
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("migrate_uploads")
+
+
+def flat_files(directory: Path) -> Iterator[os.DirEntry]:
+    """Regular files directly in directory, skipping temp files still being written"""
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False) and not entry.name.startswith("."):
+                yield entry
+
+
+def pending_moves(upload_names: Dict[str, str]) -> Iterator[Tuple[Path, Path]]:
+    for entry in flat_files(UPLOAD_DIR):
+        yield Path(entry.path), UPLOAD_DIR / shard(entry.name) / entry.name
+    for entry in flat_files(VARIANT_DIR):
+        parts = entry.name.rsplit(".", 2)
+        if len(parts) != 3 or parts[1] not in VARIANTS:
+            continue
+        # Variants shard by their upload's file name, which the stem alone doesn't give
+        source = upload_names.get(parts[0])
+        if source is None:
+            continue
+        yield Path(entry.path), VARIANT_DIR / shard(source) / entry.name
+
+
+def upload_names() -> Dict[str, str]:
+    """Stem -> file name of every upload, in either layout"""
+    names = {}
+    for root, directories, files in os.walk(UPLOAD_DIR):
+        root_path = Path(root)
+        # Variants and the transform cache are not uploads
+        if root_path == UPLOAD_DIR:
+            directories[:] = [name for name in directories if len(name) == 2]
+        for name in files:
+            if not name.startswith("."):
+                names[os.path.splitext(name)[0]] = name
+    return names
+
+
+def move_batch(batch: List[Tuple[Path, Path]], dry_run: bool) -> int:
+    moved = 0
+    for source, target in batch:
+        if dry_run:
+            moved += 1
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(source, target)
+        except FileNotFoundError:
+            # Deleted through the API since it was listed
+            continue
+        moved += 1
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move flat uploads into the sharded layout")
+    parser.add_argument("--batch-size", type=int, default=500, help="files moved between pauses")
+    parser.add_argument("--pause", type=float, default=0.2, help="seconds to sleep between batches, to leave disk time for the API")
+    parser.add_argument("--dry-run", action="store_true", help="count the files that would move")
+    args = parser.parse_args()
+
+    total = 0
+    while True:
+        # Renaming while listing can make the listing skip entries, so passes
+        # repeat until one finds nothing left to move
+        moves = pending_moves(upload_names())
+        moved = 0
+        while True:
+            batch = [move for _, move in zip(range(args.batch_size), moves)]
+            if not batch:
+                break
+            moved += move_batch(batch, args.dry_run)
+            logger.info(f"{'Would move' if args.dry_run else 'Moved'} {total + moved} files so far")
+            time.sleep(args.pause)
+        total += moved
+        if not moved or args.dry_run:
+            break
+
+    logger.info(f"{'Would move' if args.dry_run else 'Moved'} {total} files in total")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from part_lookup import backfill_lookup_fields
+from pricing import PRICE_PARSER_VERSION, backfill_price_fields
+
+logger = logging.getLogger(__name__)
+
+# A single state document records the applied version and the migration lock
+STATE_ID = "state"
+
+# Workers renew the lock while migrating; a crashed worker's lock expires
+LEASE_SECONDS = float(os.environ.get("MIGRATION_LEASE_SECONDS", "60"))
+POLL_SECONDS = 0.5
+
+# Seeded documents carry ids derived from their seed key. Without a stored
+# id every load would mint a new one, and with it a new ETag per process.
+SEED_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_DNS, "sunstar-international.com")
+
+COMPANY_INFO = {
+    "name": "SUN STAR INTERNATIONAL FZ-LLC",
+    "license_no": "5034384",
+    "manager": "Daniel Abera Wakjira",
+    "tagline": "Driving Growth. Powering Construction.",
+    "mission": "To connect global markets with high-quality cars, spare parts, and heavy equipment.",
+    "values": ["Trust", "Reliability", "Speed"],
+    "address": {
+        "building": "VVIPR1315, Compass building - Al Hulaila",
+        "zone": "AL Hulaila Industrial Zone-FZ",
+        "city": "RAK UAE",
+        "country": "United Arab Emirates"
+    },
+    "contact": {
+        "phoneUAE": "+971551849702",
+        "phoneEthiopia": "+251-911373857",
+        "email": "sunstarintl.ae@gmail.com",
+        "whatsapp": "+971551849702"
+    },
+    "license": {
+        "issueDate": "11-08-2025",
+        "expiryDate": "10-08-2026",
+        "authority": "RAKEZ"
+    }
+}
+
+PRODUCT_CATEGORIES = [
+    {
+        "id": "1",
+        "name": "New Passenger Motor Vehicles",
+        "description": "High-quality new passenger cars from trusted global manufacturers",
+        "image": "https://images.unsplash.com/photo-1601929862217-f1bf94503333?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2NjZ8MHwxfHNlYXJjaHwxfHxsdXh1cnklMjBjYXJzfGVufDB8fHxibHVlfDE3NTY3NTU3NjJ8MA&ixlib=rb-4.1.0&q=85",
+        "products": ["Sedans", "SUVs", "Hatchbacks", "Luxury Vehicles"]
+    },
+    {
+        "id": "2",
+        "name": "Auto Spare Parts & Components",
+        "description": "Comprehensive range of automotive parts and components",
+        "image": "https://images.unsplash.com/photo-1595787142948-569014817b2f?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NDk1ODB8MHwxfHNlYXJjaHw0fHxhdXRvbW90aXZlJTIwYnVzaW5lc3N8ZW58MHx8fGJsdWV8MTc1Njc1NTc1Nnww&ixlib=rb-4.1.0&q=85",
+        "products": ["Engines", "Transmissions", "Body Parts", "Electrical Components"]
+    },
+    {
+        "id": "3",
+        "name": "Heavy Equipment & Machinery Spare Parts",
+        "description": "Durable spare parts for heavy machinery and construction equipment",
+        "image": "https://images.unsplash.com/photo-1714765445826-582769cf22ff?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2Nzh8MHwxfHNlYXJjaHw0fHxoZWF2eSUyMG1hY2hpbmVyeXxlbnwwfHx8Ymx1ZXwxNzU2NzU1NzgxfDA&ixlib=rb-4.1.0&q=85",
+        "products": ["Hydraulic Parts", "Engine Components", "Tracks & Tires", "Filters & Fluids"]
+    },
+    {
+        "id": "4",
+        "name": "Construction Equipment & Machinery",
+        "description": "Professional construction machinery for all your project needs",
+        "image": "https://images.unsplash.com/photo-1655048424706-bc5e4fc9f6b5?crop=entropy&cs=srgb&fm=jpg&ixid=M3w3NTY2Nzh8MHwxfHNlYXJjaHwxfHxoZWF2eSUyMG1hY2hpbmVyeXxlbnwwfHx8Ymx1ZXwxNzU2NzU1NzgxfDA&ixlib=rb-4.1.0&q=85",
+        "products": ["Excavators", "Bulldozers", "Cranes", "Loaders", "Concrete Mixers"]
+    }
+]
+
+TESTIMONIALS = [
+    {
+        "name": "Ahmed Al-Rashid",
+        "company": "Al-Rashid Construction",
+        "text": "Sun Star International provided us with excellent construction equipment. Their professionalism and quick delivery exceeded our expectations.",
+        "rating": 5,
+        "is_featured": True,
+        "is_active": True
+    },
+    {
+        "name": "Mohammed Hassan",
+        "company": "Hassan Auto Trading",
+        "text": "The quality of spare parts and competitive pricing makes Sun Star our preferred supplier for automotive components.",
+        "rating": 5,
+        "is_featured": True,
+        "is_active": True
+    },
+    {
+        "name": "Sarah Williams",
+        "company": "International Logistics Ltd",
+        "text": "Reliable partner for our equipment needs across the Middle East. Professional service and quality products.",
+        "rating": 5,
+        "is_featured": True,
+        "is_active": True
+    }
+]
+
+ADVANTAGES = [
+    {
+        "title": "UAE Freezone Licensed Company (RAKEZ)",
+        "description": "Fully licensed and regulated by Ras Al Khaimah Economic Zone",
+        "icon": "Shield",
+        "order": 1,
+        "is_active": True
+    },
+    {
+        "title": "Global Export & Shipping",
+        "description": "Worldwide delivery with reliable logistics partners",
+        "icon": "Globe",
+        "order": 2,
+        "is_active": True
+    },
+    {
+        "title": "Wide Product Range",
+        "description": "Comprehensive inventory from cars to heavy machinery",
+        "icon": "Package",
+        "order": 3,
+        "is_active": True
+    },
+    {
+        "title": "Reliable Sourcing & Fast Delivery",
+        "description": "Trusted suppliers and efficient delivery systems",
+        "icon": "Truck",
+        "order": 4,
+        "is_active": True
+    }
+]
+
+
+def seed_id(collection: str, *values: str) -> str:
+    return str(uuid.uuid5(SEED_NAMESPACE, "/".join((collection, *values))))
+
+
+async def upsert_company_info(db):
+    """Write the company info in place, so readers never see it missing"""
+    now = datetime.utcnow()
+    await db.company_info.update_one(
+        {"license_no": COMPANY_INFO["license_no"]},
+        {
+            "$set": {**COMPANY_INFO, "updated_at": now},
+            "$setOnInsert": {"id": seed_id("company_info", COMPANY_INFO["license_no"]), "created_at": now}
+        },
+        upsert=True
+    )
+    # Earlier versions reinserted the document on every boot; drop any leftovers
+    await db.company_info.delete_many({"license_no": {"$ne": COMPANY_INFO["license_no"]}})
+
+
+def seed(collection: str, documents: List[Dict[str, Any]], key: Tuple[str, ...]):
+    """Step inserting ``documents`` into an empty collection, matched on ``key``.
+
+    Collections that already hold data (seeded by the old startup code or
+    curated by an admin) are left alone. Upserts make a retried step a no-op.
+    """
+    async def apply(db):
+        if await db[collection].find_one({}, {"_id": 1}):
+            logger.info(f"{collection} already populated, skipping seed")
+            return
+        now = datetime.utcnow()
+        await db[collection].bulk_write([
+            UpdateOne(
+                {name: document[name] for name in key},
+                {"$setOnInsert": {
+                    "id": seed_id(collection, *(str(document[name]) for name in key)),
+                    **document,
+                    "created_at": now
+                }},
+                upsert=True
+            )
+            for document in documents
+        ], ordered=False)
+    return apply
+
+
+async def backfill_catalog_ids(db) -> int:
+    """Store ids on catalog documents seeded before seeds carried them"""
+    updated = 0
+    for collection in ("company_info", "testimonials", "advantages"):
+        requests = [
+            # Derived from _id, so workers running this at once write the same id
+            UpdateOne(
+                {"_id": document["_id"], "id": {"$exists": False}},
+                {"$set": {"id": seed_id(collection, str(document["_id"]))}}
+            )
+            async for document in db[collection].find({"id": {"$exists": False}}, {"_id": 1})
+        ]
+        if requests:
+            await db[collection].bulk_write(requests, ordered=False)
+            updated += len(requests)
+    return updated
+
+
+# Applied in order and recorded by version, holding up startup until done,
+# so keep them short. Append new steps (e.g. another upsert_company_info when
+# contact details change); never renumber or edit a step that has shipped.
+MIGRATIONS: List[Tuple[int, str, Callable[[Any], Awaitable[Any]]]] = [
+    (1, "company info", upsert_company_info),
+    (2, "seed product categories", seed("product_categories", PRODUCT_CATEGORIES, ("id",))),
+    (3, "seed testimonials", seed("testimonials", TESTIMONIALS, ("name", "company"))),
+    (4, "seed advantages", seed("advantages", ADVANTAGES, ("title",))),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# Derived fields filled in for documents written by older code. These scan
+# whole collections, so they run in the background while the API serves,
+# and without the lock: each only updates documents still missing its
+# fields, so workers running one at the same time write the same values.
+# A finished backfill is recorded by name and skipped from then on; give a
+# backfill a new name to run it again (e.g. after a parser change).
+BACKFILLS: List[Tuple[str, Callable[[Any], Awaitable[int]]]] = [
+    ("catalog ids", backfill_catalog_ids),
+    ("product lookup fields", backfill_lookup_fields),
+    (f"normalised prices, parser {PRICE_PARSER_VERSION}", backfill_price_fields),
+]
+
+
+async def _acquire(db, owner: str) -> Optional[Dict[str, Any]]:
+    """Take the migration lock, returning the state document, or None if held elsewhere"""
+    now = datetime.utcnow()
+    try:
+        return await db.migrations.find_one_and_update(
+            {"_id": STATE_ID, "$or": [{"locked_until": None}, {"locked_until": {"$lt": now}}]},
+            {
+                "$set": {"locked_by": owner, "locked_until": now + timedelta(seconds=LEASE_SECONDS)},
+                "$setOnInsert": {"version": 0, "applied": []}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The state document exists but its lock is held and unexpired
+        return None
+
+
+async def _renew(db, owner: str):
+    """Extend the lease while steps run; raises once the lock can no longer be held"""
+    renewed = time.monotonic()
+    while True:
+        await asyncio.sleep(LEASE_SECONDS / 3)
+        try:
+            result = await db.migrations.update_one(
+                {"_id": STATE_ID, "locked_by": owner},
+                {"$set": {"locked_until": datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)}}
+            )
+        except PyMongoError as e:
+            # Give up with half the lease left, before another worker can take it over
+            if time.monotonic() - renewed >= LEASE_SECONDS / 2:
+                raise RuntimeError(f"Could not renew the migration lock: {e}")
+            logger.warning(f"Failed to renew the migration lock, retrying: {e}")
+            continue
+        if result.matched_count == 0:
+            raise RuntimeError("Lost the migration lock")
+        renewed = time.monotonic()
+
+
+async def _apply(db, owner: str, version: int) -> int:
+    applied = 0
+    for step_version, name, step in MIGRATIONS:
+        if step_version <= version:
+            continue
+        started = time.perf_counter()
+        await step(db)
+        result = await db.migrations.update_one(
+            {"_id": STATE_ID, "locked_by": owner},
+            {
+                "$set": {"version": step_version},
+                "$push": {"applied": {
+                    "version": step_version,
+                    "name": name,
+                    "applied_at": datetime.utcnow(),
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+                }}
+            }
+        )
+        if result.matched_count == 0:
+            raise RuntimeError(f"Lost the migration lock while applying {step_version} ({name})")
+        logger.info(f"Applied migration {step_version}: {name}")
+        applied += 1
+    return applied
+
+
+async def read_state(db) -> Dict[str, Any]:
+    """The applied version and finished backfills, empty before the first migration"""
+    return await db.migrations.find_one({"_id": STATE_ID}, {"version": 1, "backfilled": 1}) or {}
+
+
+async def run_migrations(db, state: Optional[Dict[str, Any]] = None) -> int:
+    """Bring the database up to LATEST_VERSION, returning the number of steps applied.
+
+    ``state`` is a read_state() result the caller already has. An up-to-date
+    database costs that one find_one. Otherwise one worker takes a leased
+    lock and applies the pending steps while the others wait for it.
+    """
+    if state is None:
+        state = await read_state(db)
+    if state.get("version", 0) >= LATEST_VERSION:
+        return 0
+
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    waiting = False
+    while True:
+        state = await _acquire(db, owner)
+        if state is not None:
+            break
+
+        state = await db.migrations.find_one({"_id": STATE_ID}, {"version": 1, "locked_by": 1})
+        if state and state.get("version", 0) >= LATEST_VERSION:
+            return 0
+        if not waiting:
+            waiting = True
+            logger.info(f"Waiting for migrations running on {state.get('locked_by') if state else 'another worker'}")
+        await asyncio.sleep(POLL_SECONDS)
+
+    renewer = asyncio.create_task(_renew(db, owner))
+    applying = asyncio.create_task(_apply(db, owner, state.get("version", 0)))
+    try:
+        await asyncio.wait({renewer, applying}, return_when=asyncio.FIRST_COMPLETED)
+        if not applying.done():
+            # The lease is about to lapse: stop rather than run a step next to
+            # the worker that takes over. Steps are idempotent, so it re-runs
+            # the interrupted one.
+            applying.cancel()
+            await asyncio.gather(applying, return_exceptions=True)
+            renewer.result()
+        return applying.result()
+    finally:
+        for task in (renewer, applying):
+            task.cancel()
+        await asyncio.gather(renewer, applying, return_exceptions=True)
+        await db.migrations.update_one(
+            {"_id": STATE_ID, "locked_by": owner},
+            {"$set": {"locked_by": None, "locked_until": None}}
+        )
+
+
+async def run_backfills(db, state: Optional[Dict[str, Any]] = None) -> int:
+    """Run the BACKFILLS not yet recorded as finished, returning the documents updated.
+
+    ``state`` is a read_state() result the caller already has; migrations
+    never change the finished backfills, so one read before them will do.
+    """
+    if state is None:
+        state = await read_state(db)
+    finished = set(state.get("backfilled", []))
+    updated = 0
+    for name, backfill in BACKFILLS:
+        if name in finished:
+            continue
+        try:
+            count = await backfill(db)
+        except Exception as e:
+            logger.error(f"Backfill of {name} failed: {e}")
+            continue
+        await db.migrations.update_one({"_id": STATE_ID}, {"$addToSet": {"backfilled": name}}, upsert=True)
+        logger.info(f"Backfilled {name} for {count} documents")
+        updated += count
+    return updated
@@ -1,8 +1,37 @@
 from pydantic import BaseModel, Field, EmailStr
-from typing import List, Optional, Dict, Any
+from typing import ClassVar, List, Optional, Dict, Any, Type
 from datetime import datetime
 import uuid
 
+# Stored models declare the version of their document shape as SCHEMA_VERSION
+# (1 unless they set one). Documents written by this code carry it and are
+# trusted on read; anything older goes through full validation. Bump a
+# model's version only when its own fields change.
+DEFAULT_SCHEMA_VERSION = 1
+
+# Derived fields kept in storage for indexing only, never sent to clients
+INTERNAL_FIELDS = ("part_number_key", "lookup_trigrams", "price_parser")
+
+def schema_version(model_cls: Type[BaseModel]) -> int:
+    return getattr(model_cls, "SCHEMA_VERSION", DEFAULT_SCHEMA_VERSION)
+
+def to_document(model: BaseModel) -> Dict[str, Any]:
+    """Dump a model for storage, stamped with its current schema version"""
+    document = model.model_dump()
+    document["schema_version"] = schema_version(type(model))
+    return document
+
+def from_document(model_cls: Type[BaseModel], document: Dict[str, Any]) -> Dict[str, Any]:
+    """Prepare a stored document for a response.
+
+    Documents stamped with model_cls's current schema version were produced
+    by to_document() and are passed through as-is; legacy documents are
+    validated (filling defaults) through model_cls first.
+    """
+    if document.pop("schema_version", None) == schema_version(model_cls):
+        return document
+    return model_cls(**document).model_dump()
+
 # Company Information Models
 class CompanyInfo(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -111,26 +140,53 @@ class CustomerRatingCreate(BaseModel):
 
 # Product Management Models (Admin)
 class ProductItem(BaseModel):
+    # 2: gained part_number
+    # 3: gained price_amount/price_currency
+    SCHEMA_VERSION: ClassVar[int] = 3
+
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     category_id: str
     name: str
     description: str
     price: str
+    price_amount: Optional[float] = None  # Parsed from price at write time, None for "Contact for Price"
+    price_currency: Optional[str] = None  # ISO 4217 code
+    part_number: Optional[str] = None  # OEM part number, as entered
     image_urls: List[str] = Field(default_factory=list)  # Support multiple images
     is_featured: bool = False
     is_available: bool = True
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+class ProductSearchResult(ProductItem):
+    score: float
+    highlights: Dict[str, str] = Field(default_factory=dict)  # HTML with <mark> around matches
+
+class PartLookupResult(ProductItem):
+    match_score: float  # 1.0 for an exact (normalised) part number match
+
+class FacetCount(BaseModel):
+    value: Any
+    count: int
+
+class ProductFacetResult(BaseModel):
+    total: int
+    items: List[ProductItem]
+    facets: Dict[str, List[FacetCount]]
+
 class ProductItemCreate(BaseModel):
     category_id: str
     name: str
     description: str
     price: str
+    part_number: Optional[str] = None
     image_urls: List[str] = Field(default_factory=list)  # Support multiple images
     is_featured: bool = False
     is_available: bool = True
 
+class ImageReferences(BaseModel):
+    sha256: List[str] = Field(min_length=1, max_length=50)  # Hex digests of images already stored
+
 # Response Models
 class SuccessResponse(BaseModel):
     success: bool = True
@@ -0,0 +1,33 @@
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from outbox import INQUIRY_DIGEST, INQUIRY_NOTIFICATION
+
+# "immediate" sends one email per inquiry; "digest" groups them into summaries
+NOTIFICATION_MODE = os.environ.get("NOTIFICATION_MODE", "immediate").lower()
+# A digest goes out when its oldest inquiry has waited this long...
+DIGEST_WINDOW_SECONDS = float(os.environ.get("DIGEST_WINDOW_SECONDS", "900"))
+# ...or as soon as this many inquiries are waiting (also the most per email)
+DIGEST_MAX_INQUIRIES = int(os.environ.get("DIGEST_MAX_INQUIRIES", "100"))
+# Inquiry types that always notify immediately, e.g. "partnership,custom"
+DIGEST_IMMEDIATE_TYPES = frozenset(
+    value.strip().lower() for value in os.environ.get("DIGEST_IMMEDIATE_TYPES", "").split(",") if value.strip()
+)
+
+
+def inquiry_message_kind(inquiry_type: str) -> str:
+    """Outbox kind for a new inquiry: its own email, or a place in the next digest"""
+    if NOTIFICATION_MODE != "digest" or inquiry_type.lower() in DIGEST_IMMEDIATE_TYPES:
+        return INQUIRY_NOTIFICATION
+    return INQUIRY_DIGEST
+
+
+def digest_due(waiting: int, oldest: Optional[Dict[str, Any]], now: Optional[datetime] = None) -> bool:
+    """Whether the waiting digest inquiries should be sent now"""
+    if not waiting or oldest is None:
+        return False
+    if waiting >= DIGEST_MAX_INQUIRIES:
+        return True
+    now = now or datetime.utcnow()
+    return oldest["created_at"] <= now - timedelta(seconds=DIGEST_WINDOW_SECONDS)
@@ -0,0 +1,199 @@
+import logging
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+# Message kinds, each handled by outbox_worker.HANDLERS
+INQUIRY_NOTIFICATION = "inquiry_notification"
+# Inquiries waiting for the next digest email (see notifications.py)
+INQUIRY_DIGEST = "inquiry_digest"
+# Kinds delivered in groups by claim_batch rather than one at a time
+BATCHED_KINDS = [INQUIRY_DIGEST]
+
+PENDING = "pending"
+PROCESSING = "processing"
+SENT = "sent"
+DEAD = "dead"
+
+MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "8"))
+LEASE_SECONDS = float(os.environ.get("OUTBOX_LEASE_SECONDS", "60"))
+BACKOFF_SECONDS = float(os.environ.get("OUTBOX_BACKOFF_SECONDS", "30"))
+MAX_BACKOFF_SECONDS = 3600.0
+# Delivered messages are removed by a TTL index after this long
+RETENTION_SECONDS = int(float(os.environ.get("OUTBOX_RETENTION_DAYS", "7")) * 86400)
+
+_transactions: Optional[bool] = None
+
+
+def new_message(kind: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    now = datetime.utcnow()
+    return {
+        "id": str(uuid.uuid4()),
+        "kind": kind,
+        "payload": payload,
+        "status": PENDING,
+        "attempts": 0,
+        "available_at": now,
+        "created_at": now,
+    }
+
+
+async def transactions_supported(db) -> bool:
+    """Multi-document transactions need a replica set or a sharded cluster"""
+    global _transactions
+    if _transactions is None:
+        try:
+            hello = await db.client.admin.command("hello")
+            _transactions = "setName" in hello or hello.get("msg") == "isdbgrid"
+        except Exception:
+            _transactions = False
+    return _transactions
+
+
+async def insert_with_message(db, collection: str, document: Dict[str, Any], kind: str, payload: Dict[str, Any]):
+    """Insert ``document`` and queue an outbox message for it in one transaction.
+
+    On a standalone server the two inserts run back to back; the document is
+    written first so a message never refers to something that was not saved.
+    """
+    message = new_message(kind, payload)
+    if await transactions_supported(db):
+        async with await db.client.start_session() as session:
+            async with session.start_transaction():
+                await db[collection].insert_one(document, session=session)
+                await db.outbox.insert_one(message, session=session)
+    else:
+        await db[collection].insert_one(document)
+        await db.outbox.insert_one(message)
+    return message
+
+
+def claimable(now: datetime) -> Dict[str, Any]:
+    """Due messages delivered one at a time"""
+    return {"status": PENDING, "available_at": {"$lte": now}, "kind": {"$nin": BATCHED_KINDS}}
+
+
+def due(kind: str, now: datetime) -> Dict[str, Any]:
+    """Due messages of one batched kind"""
+    return {"kind": kind, "status": PENDING, "available_at": {"$lte": now}}
+
+
+def expired_leases(now: datetime) -> Dict[str, Any]:
+    return {"status": PROCESSING, "lease_until": {"$lt": now}}
+
+
+async def claim(db, worker_id: str) -> Optional[Dict[str, Any]]:
+    """Lease the oldest due message to ``worker_id``"""
+    now = datetime.utcnow()
+    return await db.outbox.find_one_and_update(
+        claimable(now),
+        {
+            "$set": {
+                "status": PROCESSING,
+                "locked_by": worker_id,
+                "lease_until": now + timedelta(seconds=LEASE_SECONDS),
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("available_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def waiting(db, kind: str) -> Tuple[int, Optional[Dict[str, Any]]]:
+    """Number of due messages of ``kind`` and the oldest of them"""
+    now = datetime.utcnow()
+    count = await db.outbox.count_documents(due(kind, now))
+    oldest = await db.outbox.find_one(due(kind, now), {"_id": 0, "created_at": 1}, sort=[("created_at", 1)]) if count else None
+    return count, oldest
+
+
+async def claim_batch(db, worker_id: str, kind: str, limit: int) -> List[Dict[str, Any]]:
+    """Lease up to ``limit`` of the oldest due messages of ``kind`` together"""
+    due_query = due(kind, datetime.utcnow())
+    ids = [message["id"] async for message in db.outbox.find(due_query, {"_id": 0, "id": 1}).sort("created_at", 1).limit(limit)]
+    if not ids:
+        return []
+    # Messages another worker grabbed in the meantime no longer match ``due_query``
+    owner = f"{worker_id}:{uuid.uuid4().hex[:8]}"
+    await db.outbox.update_many(
+        {**due_query, "id": {"$in": ids}},
+        {
+            "$set": {
+                "status": PROCESSING,
+                "locked_by": owner,
+                "lease_until": datetime.utcnow() + timedelta(seconds=LEASE_SECONDS),
+            },
+            "$inc": {"attempts": 1},
+        },
+    )
+    return [message async for message in db.outbox.find({"id": {"$in": ids}, "locked_by": owner}).sort("created_at", 1)]
+
+
+async def ack(db, message: Dict[str, Any]):
+    await db.outbox.update_one(
+        {"id": message["id"], "locked_by": message["locked_by"]},
+        {"$set": {"status": SENT, "sent_at": datetime.utcnow()}, "$unset": {"lease_until": "", "locked_by": ""}},
+    )
+
+
+async def ack_batch(db, messages: List[Dict[str, Any]]):
+    await db.outbox.update_many(
+        {"id": {"$in": [message["id"] for message in messages]}, "locked_by": messages[0]["locked_by"]},
+        {"$set": {"status": SENT, "sent_at": datetime.utcnow()}, "$unset": {"lease_until": "", "locked_by": ""}},
+    )
+
+
+def backoff(attempts: int) -> float:
+    """Exponential backoff with jitter: ~30s, 1m, 2m, ... capped at an hour"""
+    delay = min(BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+async def fail(db, message: Dict[str, Any], error: str):
+    """Schedule a retry, or park the message as dead after MAX_ATTEMPTS"""
+    update: Dict[str, Any] = {"last_error": error[:500]}
+    if message["attempts"] >= MAX_ATTEMPTS:
+        update["status"] = DEAD
+        logger.error(f"Outbox message {message['id']} ({message['kind']}) gave up after {message['attempts']} attempts: {error}")
+    else:
+        delay = backoff(message["attempts"])
+        update.update(status=PENDING, available_at=datetime.utcnow() + timedelta(seconds=delay))
+        logger.warning(f"Outbox message {message['id']} failed (attempt {message['attempts']}), retrying in {delay:.0f}s: {error}")
+    await db.outbox.update_one(
+        {"id": message["id"], "locked_by": message["locked_by"]},
+        {"$set": update, "$unset": {"lease_until": "", "locked_by": ""}},
+    )
+
+
+async def release_expired(db) -> int:
+    """Return messages whose worker died mid-delivery to the queue"""
+    result = await db.outbox.update_many(
+        expired_leases(datetime.utcnow()),
+        {"$set": {"status": PENDING, "available_at": datetime.utcnow()}, "$unset": {"lease_until": "", "locked_by": ""}},
+    )
+    if result.modified_count:
+        logger.warning(f"Released {result.modified_count} outbox messages with expired leases")
+    return result.modified_count
+
+
+async def requeue_dead(db) -> int:
+    """Give dead messages a fresh set of attempts, e.g. after fixing SMTP credentials"""
+    result = await db.outbox.update_many(
+        {"status": DEAD},
+        {"$set": {"status": PENDING, "attempts": 0, "available_at": datetime.utcnow()}},
+    )
+    return result.modified_count
+
+
+async def outbox_stats(db) -> Dict[str, int]:
+    counts = {status: 0 for status in (PENDING, PROCESSING, SENT, DEAD)}
+    async for row in db.outbox.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+        counts[row["_id"]] = row["count"]
+    return counts
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Outbox delivery worker for Sun Star International
+Claims queued messages from the outbox collection, delivers them, and
+acknowledges or reschedules them with exponential backoff.
+
+Runs as its own process, so email delivery never competes with request
+serving: outbox_worker.supervisor.conf starts it under the same supervisor
+as the API. Claims are leased, so any number of workers can run at once.
+Setups without a supervisor can opt into running the worker inside the
+API process instead with OUTBOX_WORKER=embedded.
+
+Usage: python outbox_worker.py [--once] [--requeue-dead]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+from email_service import email_service
+from models import ContactInquiry
+from notifications import DIGEST_MAX_INQUIRIES, digest_due
+from outbox import (
+    INQUIRY_DIGEST, INQUIRY_NOTIFICATION, ack, ack_batch, claim, claim_batch, fail,
+    release_expired, requeue_dead, waiting
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("outbox_worker")
+
+POLL_SECONDS = float(os.environ.get("OUTBOX_POLL_SECONDS", "1"))
+CONCURRENCY = int(os.environ.get("OUTBOX_CONCURRENCY", "4"))
+# "external": this script delivers; "embedded": the API runs the worker in-process
+WORKER_MODE = os.environ.get("OUTBOX_WORKER", "external").lower()
+# Delay before an embedded worker that crashed starts again
+RESTART_SECONDS = 5
+
+
+async def notify_inquiry(payload: Dict[str, Any]):
+    """Email the team about a new contact inquiry"""
+    inquiry = ContactInquiry(**payload)
+    await email_service.send_contact_email(inquiry)
+    logger.info(f"✅ Email notification sent for inquiry {inquiry.id}")
+
+
+async def notify_inquiry_digest(payloads: List[Dict[str, Any]]):
+    """Email one summary of several inquiries"""
+    await email_service.send_digest_email([ContactInquiry(**payload) for payload in payloads])
+    logger.info(f"✅ Digest email sent for {len(payloads)} inquiries")
+
+
+HANDLERS: Dict[str, Callable[[Dict[str, Any]], Awaitable[None]]] = {
+    INQUIRY_NOTIFICATION: notify_inquiry,
+}
+
+# Handlers for outbox.BATCHED_KINDS, called with the payloads of a whole batch
+BATCH_HANDLERS: Dict[str, Callable[[List[Dict[str, Any]]], Awaitable[None]]] = {
+    INQUIRY_DIGEST: notify_inquiry_digest,
+}
+
+
+async def deliver(db, message: Dict[str, Any]):
+    handler = HANDLERS.get(message["kind"])
+    try:
+        if handler is None:
+            raise RuntimeError(f"No handler for outbox message kind {message['kind']!r}")
+        await handler(message["payload"])
+    except Exception as e:
+        await fail(db, message, f"{type(e).__name__}: {e}")
+    else:
+        await ack(db, message)
+
+
+async def consume(db, worker_id: str, stop: asyncio.Event, once: bool):
+    """Claim and deliver messages until the queue is empty, then poll"""
+    while not stop.is_set():
+        message = await claim(db, worker_id)
+        if message is not None:
+            await deliver(db, message)
+            continue
+        if once:
+            return
+        try:
+            await asyncio.wait_for(stop.wait(), POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def deliver_batch(db, kind: str, messages: List[Dict[str, Any]]):
+    try:
+        await BATCH_HANDLERS[kind]([message["payload"] for message in messages])
+    except Exception as e:
+        for message in messages:
+            await fail(db, message, f"{type(e).__name__}: {e}")
+    else:
+        await ack_batch(db, messages)
+
+
+async def digester(db, worker_id: str, stop: asyncio.Event, once: bool):
+    """Send a digest whenever enough inquiries are waiting or the oldest has waited long enough"""
+    while not stop.is_set():
+        for kind in BATCH_HANDLERS:
+            count, oldest = await waiting(db, kind)
+            # --once drains everything regardless of the window
+            while (once and count) or digest_due(count, oldest):
+                messages = await claim_batch(db, worker_id, kind, DIGEST_MAX_INQUIRIES)
+                if messages:
+                    await deliver_batch(db, kind, messages)
+                count, oldest = await waiting(db, kind)
+        if once:
+            return
+        try:
+            await asyncio.wait_for(stop.wait(), POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def reaper(db, stop: asyncio.Event):
+    """Periodically requeue messages held by workers that died"""
+    while not stop.is_set():
+        try:
+            await release_expired(db)
+        except Exception as e:
+            logger.error(f"Failed to release expired outbox leases: {e}")
+        try:
+            await asyncio.wait_for(stop.wait(), 30)
+        except asyncio.TimeoutError:
+            pass
+
+
+def new_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+async def run(db, worker_id: str, stop: asyncio.Event, once: bool = False):
+    """Deliver messages until ``stop`` is set, or until the queue is drained with ``once``"""
+    await release_expired(db)
+
+    logger.info(f"Outbox worker {worker_id} started with {CONCURRENCY} consumers")
+    consumers = [consume(db, worker_id, stop, once) for _ in range(CONCURRENCY)]
+    consumers.append(digester(db, worker_id, stop, once))
+    if once:
+        await asyncio.gather(*consumers)
+    else:
+        await asyncio.gather(reaper(db, stop), *consumers)
+
+
+async def run_embedded(db, stop: asyncio.Event):
+    """The worker inside an API process, restarted after errors until ``stop`` is set"""
+    worker_id = new_worker_id()
+    while not stop.is_set():
+        try:
+            await run(db, worker_id, stop)
+        except Exception as e:
+            logger.error(f"Outbox worker {worker_id} failed, restarting in {RESTART_SECONDS}s: {e}")
+            try:
+                await asyncio.wait_for(stop.wait(), RESTART_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Deliver queued outbox messages")
+    parser.add_argument("--once", action="store_true", help="drain the queue and exit")
+    parser.add_argument("--requeue-dead", action="store_true", help="retry messages that exhausted their attempts")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL'))
+    db = client[os.environ.get('DB_NAME', 'sunstar_db')]
+    worker_id = new_worker_id()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        if args.requeue_dead:
+            logger.info(f"Requeued {await requeue_dead(db)} dead outbox messages")
+        await run(db, worker_id, stop, args.once)
+    finally:
+        # In-flight messages finish first; anything unacked is retried after its lease
+        await email_service.close()
+        client.close()
+        logger.info("Outbox worker stopped")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+import base64
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import orjson
+from fastapi import HTTPException
+
+# Upper bound for any page, whatever the client asks for
+MAX_PAGE_SIZE = 200
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class KeysetPage:
+    """Keyset pagination over a (created_at, id) sort key.
+
+    Both fields are written on every document and covered by an index, so a
+    page costs one index seek however deep into the collection it starts.
+    """
+
+    def __init__(self, direction: int = -1):
+        self.direction = direction
+        self.sort: List[Tuple[str, int]] = [("created_at", direction), ("id", direction)]
+
+    def query(self, filter_query: Dict[str, Any], cursor: Optional[str]) -> Dict[str, Any]:
+        """Restrict ``filter_query`` to documents after ``cursor``"""
+        if not cursor:
+            return filter_query
+
+        created_at, last_id = decode_cursor(cursor)
+        op = "$lt" if self.direction < 0 else "$gt"
+        after = {"$or": [
+            {"created_at": {op: created_at}},
+            {"created_at": created_at, "id": {op: last_id}},
+        ]}
+        return {"$and": [filter_query, after]} if filter_query else after
+
+    def next_cursor(self, documents: List[Dict[str, Any]], limit: int) -> Optional[str]:
+        """Cursor for the page after ``documents``, or None on the last page"""
+        if len(documents) < limit:
+            return None
+        last = documents[-1]
+        return encode_cursor(last["created_at"], last["id"])
+
+
+def encode_cursor(created_at: datetime, last_id: str) -> str:
+    raw = orjson.dumps([created_at.isoformat(), last_id])
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, last_id = orjson.loads(raw)
+        return datetime.fromisoformat(created_at), str(last_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def page_headers(cursor: Optional[str]) -> Dict[str, str]:
+    return {NEXT_CURSOR_HEADER: cursor} if cursor else {}
@@ -0,0 +1,85 @@
+import logging
+import re
+from difflib import SequenceMatcher
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+_NOT_ALNUM = re.compile(r"[^0-9A-Z]")
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Candidates pulled from the trigram index before exact re-ranking
+CANDIDATE_POOL = 100
+
+
+def normalize_key(value: Optional[str]) -> str:
+    """Uppercase and strip everything but letters and digits: '04152-yzza1' -> '04152YZZA1'"""
+    return _NOT_ALNUM.sub("", (value or "").upper())
+
+
+def trigrams(key: str) -> Set[str]:
+    """Trigrams of a normalised key, padded so short keys and prefixes still match"""
+    if not key:
+        return set()
+    padded = f"^{key}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def name_trigrams(name: Optional[str]) -> Set[str]:
+    grams: Set[str] = set()
+    for word in _WORD.findall(name or ""):
+        grams |= trigrams(normalize_key(word))
+    return grams
+
+
+def lookup_fields(name: Optional[str], part_number: Optional[str]) -> Dict[str, Any]:
+    """Derived fields stored next to a product so lookups hit an index"""
+    key = normalize_key(part_number)
+    return {
+        "part_number_key": key or None,
+        "lookup_trigrams": sorted(trigrams(key) | name_trigrams(name)),
+    }
+
+
+def similarity(query_key: str, candidate: Dict[str, Any]) -> float:
+    """Closeness of a product to the query in [0, 1]; part numbers weigh more than names"""
+    scores = [0.0]
+    part_key = candidate.get("part_number_key")
+    if part_key:
+        scores.append(SequenceMatcher(None, query_key, part_key).ratio())
+
+    query_grams = trigrams(query_key)
+    name_grams = name_trigrams(candidate.get("name"))
+    if query_grams and name_grams:
+        # Containment rather than Jaccard: a name is much longer than a query
+        scores.append(0.9 * len(query_grams & name_grams) / len(query_grams))
+    return max(scores)
+
+
+def rank(query_key: str, candidates: Iterable[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    scored = [(similarity(query_key, candidate), candidate) for candidate in candidates]
+    scored.sort(key=lambda pair: pair[0], reverse=True)
+    return [{**candidate, "match_score": round(score, 4)} for score, candidate in scored[:limit] if score > 0]
+
+
+async def backfill_lookup_fields(db, batch_size: int = 500) -> int:
+    """Add lookup fields to products written before part numbers existed"""
+    updated = 0
+    while True:
+        batch = [
+            product async for product in db.admin_products.find(
+                {"lookup_trigrams": {"$exists": False}},
+                {"_id": 1, "name": 1, "part_number": 1}
+            ).limit(batch_size)
+        ]
+        if not batch:
+            return updated
+        requests = [
+            UpdateOne({"_id": product["_id"]}, {"$set": lookup_fields(product.get("name"), product.get("part_number"))})
+            for product in batch
+        ]
+        await db.admin_products.bulk_write(requests, ordered=False)
+        updated += len(batch)
+        logger.info(f"Backfilled lookup fields for {updated} products")
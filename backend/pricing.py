@@ -0,0 +1,171 @@
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+# Prices typed without a currency are in the company's home currency
+DEFAULT_CURRENCY = os.environ.get("DEFAULT_PRICE_CURRENCY", "AED")
+
+CURRENCY_SYMBOLS = {
+    "$": "USD",
+    "US$": "USD",
+    "€": "EUR",
+    "£": "GBP",
+    "¥": "JPY",
+    "د.إ": "AED",
+    "DHS": "AED",
+    "DH": "AED",
+    "BIRR": "ETB",
+    "BR": "ETB",
+}
+# Stored with the parsed fields; products parsed by an older parser are parsed again
+# 2: amounts are taken next to the currency, ambiguous prices give None
+# 3: a dot before three digits groups thousands, as a comma does
+PRICE_PARSER_VERSION = 3
+
+# Searched in this order, so the result never depends on set iteration
+CURRENCY_CODES = ("AED", "USD", "EUR", "GBP", "JPY", "ETB", "SAR", "CNY", "INR")
+
+# A number with an optional multiplier word. Spaces only separate thousands
+# ("12 500"), so digit runs like phone numbers are not joined into one amount.
+_NUMBER = re.compile(
+    r"(?<![\d.,+])(\d{1,3}(?:([,. ])\d{3})(?:\2\d{3})*(?:[.,]\d+)?|\d+(?:[.,]\d+)?)(?![\d])"
+    r"(?:\s*(k|thousand|m|mn|million|bn|billion)(?![A-Za-z]))?",
+    re.IGNORECASE
+)
+_MULTIPLIERS = {
+    "k": 1_000, "thousand": 1_000,
+    "m": 1_000_000, "mn": 1_000_000, "million": 1_000_000,
+    "bn": 1_000_000_000, "billion": 1_000_000_000,
+}
+# Only this may separate a currency from its amount: "AED 12,500", "25k USD"
+_ADJACENT = re.compile(r"^[\s:]*$")
+
+
+def _parse_number(text: str) -> Optional[float]:
+    text = text.strip().replace(" ", "")
+    if "," in text and "." in text:
+        # Whichever separator comes last is the decimal point: 12,500.00 / 12.500,00
+        if text.rfind(",") > text.rfind("."):
+            text = text.replace(".", "").replace(",", ".")
+        else:
+            text = text.replace(",", "")
+    elif "," in text or "." in text:
+        # Either separator before three digits groups thousands (12,500 / 12.500),
+        # before any other count it is the decimal point (12,5 / 12.5)
+        separator = "," if "," in text else "."
+        whole, _, fraction = text.rpartition(separator)
+        whole = whole.replace(separator, "")
+        text = f"{whole}{fraction}" if len(fraction) == 3 else f"{whole}.{fraction}"
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _currencies(upper: str) -> List[Tuple[int, int, str]]:
+    """(start, end, ISO code) of every currency mentioned, in order of position"""
+    found = []
+    taken = set()
+    # Codes first, then symbols longest first, so "US$" wins over "$" and "DHS" over "DH"
+    tokens = [(code, code) for code in CURRENCY_CODES]
+    tokens += [(symbol, CURRENCY_SYMBOLS[symbol]) for symbol in sorted(CURRENCY_SYMBOLS, key=len, reverse=True)]
+    for token, code in tokens:
+        # Letters must stand alone ("BR" is not in "BRAKE"); digits may touch ("AED12,500")
+        pattern = rf"(?<![A-Z]){re.escape(token)}(?![A-Z])" if token.isalpha() else re.escape(token)
+        for match in re.finditer(pattern, upper):
+            span = set(range(match.start(), match.end()))
+            if not span & taken:
+                taken |= span
+                found.append((match.start(), match.end(), code))
+    return sorted(found)
+
+
+def _numbers(price: str, currencies: List[Tuple[int, int, str]]) -> List[Tuple[int, int, float]]:
+    """(start, end, amount) of every number, multipliers applied"""
+    currency_ends = {end for _, end, _ in currencies}
+    numbers = []
+    for match in _NUMBER.finditer(price):
+        start = match.start()
+        # Digits glued to a word ("V8", "4x4") are not amounts, unless the word is a currency
+        if start and price[start - 1].isalpha() and start not in currency_ends:
+            continue
+        amount = _parse_number(match.group(1))
+        if amount is None:
+            continue
+        if match.group(3):
+            amount *= _MULTIPLIERS[match.group(3).lower()]
+        numbers.append((start, match.end(), amount))
+    return numbers
+
+
+def parse_price(price: Optional[str]) -> Tuple[Optional[float], Optional[str]]:
+    """Split a free-form price into (amount, ISO currency).
+
+    "AED 12,500" -> (12500.0, "AED"), "$25k" -> (25000.0, "USD"),
+    "4x4 SUV AED 90000" -> (90000.0, "AED"), "Contact for Price" -> (None, None).
+    The amount is the number written next to the currency; a price without a
+    currency must contain exactly one number. Anything else is ambiguous
+    (two currencies, a phone number) and gives (None, None).
+    """
+    if not price:
+        return None, None
+
+    currencies = _currencies(price.upper())
+    numbers = _numbers(price, currencies)
+    if not numbers:
+        return None, None
+
+    if not currencies:
+        if len(numbers) != 1:
+            return None, None
+        return numbers[0][2], DEFAULT_CURRENCY
+
+    # Each currency takes the number right after it ("AED 100"), else right before ("100 AED")
+    priced = []
+    for start, end, code in currencies:
+        after = next((n for n in numbers if n[0] >= end and _ADJACENT.match(price[end:n[0]])), None)
+        before = next((n for n in reversed(numbers) if n[1] <= start and _ADJACENT.match(price[n[1]:start])), None)
+        if after or before:
+            priced.append((code, (after or before)[2]))
+    if not priced:
+        # A lone currency somewhere in the text still names the only number's currency
+        codes = {code for _, _, code in currencies}
+        if len(codes) == 1 and len(numbers) == 1:
+            return numbers[0][2], codes.pop()
+        return None, None
+    if len({code for code, _ in priced}) > 1:
+        return None, None
+    code, amount = priced[0]
+    return amount, code
+
+
+def price_fields(price: Optional[str]) -> Dict[str, Any]:
+    """Normalised price fields stored next to the free-form price"""
+    amount, currency = parse_price(price)
+    return {"price_amount": amount, "price_currency": currency, "price_parser": PRICE_PARSER_VERSION}
+
+
+async def backfill_price_fields(db, batch_size: int = 500) -> int:
+    """Add normalised prices to products written before they existed or by an older parser"""
+    updated = 0
+    while True:
+        batch = [
+            product async for product in db.admin_products.find(
+                {"price_parser": {"$ne": PRICE_PARSER_VERSION}},
+                {"_id": 1, "price": 1}
+            ).limit(batch_size)
+        ]
+        if not batch:
+            return updated
+        requests = [
+            UpdateOne({"_id": product["_id"]}, {"$set": price_fields(product.get("price"))})
+            for product in batch
+        ]
+        await db.admin_products.bulk_write(requests, ordered=False)
+        updated += len(batch)
+        logger.info(f"Backfilled normalised prices for {updated} products")
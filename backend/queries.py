@@ -0,0 +1,90 @@
+from typing import Any, Dict, List, Optional
+
+# Filters sent to MongoDB by the routes. They are built here, not inline, so
+# index_usage_test.py explains exactly the queries the API runs against the
+# indexes declared in indexes.py.
+
+ADVANTAGES_ORDER = [("order", 1)]
+
+
+def split_ids(value: Optional[str]) -> List[str]:
+    """Comma-separated ids from a query parameter"""
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+
+def category_products(category_id: str) -> Dict[str, Any]:
+    return {"category_id": category_id}
+
+
+def active_testimonials(featured_only: bool) -> Dict[str, Any]:
+    filter_query = {"is_active": True}
+    if featured_only:
+        filter_query["is_featured"] = True
+    return filter_query
+
+
+def active_advantages() -> Dict[str, Any]:
+    return {"is_active": True}
+
+
+def inquiries_filter(status: Optional[str]) -> Dict[str, Any]:
+    return {"status": status} if status else {}
+
+
+def ratings_filter(category: Optional[str]) -> Dict[str, Any]:
+    return {"service_category": category} if category else {}
+
+
+def product_search(q: str, category_id: Optional[str]) -> Dict[str, Any]:
+    filter_query = {"$text": {"$search": q}}
+    if category_id:
+        filter_query["category_id"] = {"$in": split_ids(category_id)}
+    return filter_query
+
+
+def part_number_exact(query_key: str) -> Dict[str, Any]:
+    return {"part_number_key": query_key}
+
+
+def part_number_candidates(query_grams: List[str]) -> Dict[str, Any]:
+    return {"lookup_trigrams": {"$in": query_grams}}
+
+
+def products_by_ids(ids: List[str]) -> Dict[str, Any]:
+    return {"id": {"$in": ids}}
+
+
+def product_facets(
+    category_id: Optional[str] = None,
+    available: Optional[bool] = None,
+    featured: Optional[bool] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    currency: Optional[str] = None,
+) -> Dict[str, Any]:
+    filter_query: Dict[str, Any] = {}
+    if category_id:
+        filter_query["category_id"] = {"$in": split_ids(category_id)}
+    if available is not None:
+        filter_query["is_available"] = available
+    if featured is not None:
+        filter_query["is_featured"] = featured
+    if min_price is not None or max_price is not None:
+        price_range = {}
+        if min_price is not None:
+            price_range["$gte"] = min_price
+        if max_price is not None:
+            price_range["$lte"] = max_price
+        filter_query["price_amount"] = price_range
+    if currency:
+        filter_query["price_currency"] = currency.upper()
+    return filter_query
+
+
+def image_by_digest(digest: str) -> Dict[str, Any]:
+    return {"sha256": digest}
+
+
+def referenced_image(filename: str) -> Dict[str, Any]:
+    """A stored image that still holds at least one reference"""
+    return {"filename": filename, "refs": {"$gt": 0}}
@@ -1,7 +1,8 @@
-from fastapi import APIRouter, HTTPException, Request, BackgroundTasks, UploadFile, File
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi.responses import JSONResponse, FileResponse, Response
 from typing import List, Optional
 from datetime import datetime
+import asyncio
 import logging
 import os
 import uuid
@@ -9,68 +10,335 @@ import shutil
 from pathlib import Path
 
 from database import get_database
+from cache import catalog_cache
+from serialization import json_response, stream_format, stream_response
+from pagination import MAX_PAGE_SIZE, KeysetPage, page_headers
+from fieldsets import Fieldset
+from indexes import reconcile_indexes
+from search import highlight, query_terms
+from part_lookup import CANDIDATE_POOL, lookup_fields, normalize_key, rank, trigrams
+from pricing import price_fields
+from queries import (
+    ADVANTAGES_ORDER, active_advantages, active_testimonials, category_products, image_by_digest, inquiries_filter,
+    part_number_candidates, part_number_exact, product_facets, product_search, products_by_ids, ratings_filter
+)
+from http_cache import (
+    CATALOG_CACHE_POLICY, IMAGE_CACHE_POLICY, PENDING_IMAGE_CACHE_POLICY, RATINGS_CACHE_POLICY, RenderedResponse,
+    cached_response, file_response, render
+)
 from models import (
     CompanyInfo, ProductCategory, Product, ContactInquiry, ContactInquiryCreate,
     Testimonial, Advantage, SuccessResponse, ErrorResponse, CustomerRating, 
-    CustomerRatingCreate, ProductItem, ProductItemCreate
+    CustomerRatingCreate, ProductItem, ProductItemCreate, ProductSearchResult,
+    PartLookupResult, ProductFacetResult, ImageReferences, INTERNAL_FIELDS, to_document, from_document
+)
+from outbox import insert_with_message, outbox_stats
+from notifications import inquiry_message_kind
+from uploads import (
+    UPLOAD_OPENAPI, ImageUpload, add_references, content_etag, disposition_headers, flat_path, locate, media_type, release,
+    stored_path, unlink_stored
 )
-from email_service import email_service
+from image_variants import VARIANTS, find_variant, remove_variants, schedule_variants
+from image_transforms import FITS, MAX_DIMENSION, TRANSFORM_FORMATS, transform, transform_cache
+from file_serving import file_metrics, hot_files
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# Create uploads directory if it doesn't exist
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
+# Catalog loaders (served from the in-process catalog cache)
+def rendered(loader):
+    """Wrap a loader so the cache keeps the encoded body alongside the data"""
+    async def load():
+        return render(await loader())
+    return load
+
+async def load_company_info() -> Optional[CompanyInfo]:
+    db = get_database()
+    company_data = await db.company_info.find_one({}, {"_id": 0})
+    return CompanyInfo(**company_data) if company_data else None
+
+async def load_product_categories() -> List[ProductCategory]:
+    db = get_database()
+    return [ProductCategory(**category) async for category in db.product_categories.find({}, {"_id": 0})]
+
+def products_loader(category_id: str):
+    async def load_products() -> List[Product]:
+        db = get_database()
+        return [Product(**product) async for product in db.products.find(category_products(category_id), {"_id": 0})]
+    return load_products
+
+def testimonials_loader(featured_only: bool):
+    async def load_testimonials() -> List[Testimonial]:
+        db = get_database()
+        return [
+            Testimonial(**testimonial)
+            async for testimonial in db.testimonials.find(active_testimonials(featured_only), {"_id": 0})
+        ]
+    return load_testimonials
+
+async def load_advantages() -> List[Advantage]:
+    db = get_database()
+    return [
+        Advantage(**advantage)
+        async for advantage in db.advantages.find(active_advantages(), {"_id": 0}).sort(ADVANTAGES_ORDER)
+    ]
+
+def catalog_response(request: Request, cached: RenderedResponse, fieldset: Fieldset):
+    """Respond with cached catalog data, reduced to the requested fields if any"""
+    if fieldset.fields:
+        cached = render([fieldset.select_model(item) for item in cached.data])
+    return cached_response(request, cached, CATALOG_CACHE_POLICY)
+
+async def warm_catalog_cache():
+    """Load the homepage catalog data into memory"""
+    await catalog_cache.get("company_info", None, rendered(load_company_info))
+    await catalog_cache.get("product_categories", None, rendered(load_product_categories))
+    await catalog_cache.get("testimonials", True, rendered(testimonials_loader(True)))
+    await catalog_cache.get("advantages", None, rendered(load_advantages))
+
+# Listing output formats: a JSON array page (default) or a streamed export
+OUTPUT_FORMATS = "^(json|ndjson|json-stream)$"
 
 # Company Information Endpoints
 @router.get("/company-info", response_model=CompanyInfo)
-async def get_company_info():
+async def get_company_info(request: Request):
     """Get company information"""
     try:
-        db = get_database()
-        company_data = await db.company_info.find_one({}, {"_id": 0})
+        company_info = await catalog_cache.get("company_info", None, rendered(load_company_info))
         
-        if not company_data:
+        if not company_info.data:
             raise HTTPException(status_code=404, detail="Company information not found")
         
-        return CompanyInfo(**company_data)
+        return cached_response(request, company_info, CATALOG_CACHE_POLICY)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching company info: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 # Product Endpoints
 @router.get("/products/categories", response_model=List[ProductCategory])
-async def get_product_categories():
+async def get_product_categories(request: Request, fields: Optional[str] = None):
     """Get all product categories"""
+    fieldset = Fieldset(ProductCategory, fields)
     try:
-        db = get_database()
-        categories = []
-        
-        async for category in db.product_categories.find({}, {"_id": 0}):
-            categories.append(ProductCategory(**category))
-        
-        return categories
+        categories = await catalog_cache.get("product_categories", None, rendered(load_product_categories))
+        return catalog_response(request, categories, fieldset)
     except Exception as e:
         logger.error(f"Error fetching product categories: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/products/category/{category_id}", response_model=List[Product])
-async def get_products_by_category(category_id: str):
+async def get_products_by_category(category_id: str, request: Request, fields: Optional[str] = None):
     """Get products by category ID"""
+    fieldset = Fieldset(Product, fields)
     try:
-        db = get_database()
-        products = []
+        categories = await catalog_cache.get("product_categories", None, rendered(load_product_categories))
         
-        async for product in db.products.find({"category_id": category_id}, {"_id": 0}):
-            products.append(Product(**product))
+        # Only known categories are cached so arbitrary ids cannot grow the cache
+        if any(category.id == category_id for category in categories.data):
+            products = await catalog_cache.get("products", category_id, rendered(products_loader(category_id)))
+        else:
+            products = render(await products_loader(category_id)())
         
-        return products
+        return catalog_response(request, products, fieldset)
     except Exception as e:
         logger.error(f"Error fetching products for category {category_id}: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@router.get("/products/search", response_model=List[ProductSearchResult])
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    category_id: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE)
+):
+    """Full-text search over product names and descriptions, best matches first"""
+    terms = query_terms(q)
+    if not terms:
+        raise HTTPException(status_code=400, detail="Search query must contain at least one word")
+    
+    try:
+        db = get_database()
+        
+        results = []
+        async for product in db.admin_products.find(
+            product_search(q, category_id),
+            {"_id": 0, "score": {"$meta": "textScore"}, **{name: 0 for name in INTERNAL_FIELDS}}
+        ).sort([("score", {"$meta": "textScore"})]).limit(limit):
+            score = product.pop("score")
+            result = from_document(ProductItem, product)
+            result["score"] = round(score, 4)
+            result["highlights"] = {
+                "name": highlight(result["name"], terms),
+                "description": highlight(result["description"], terms, snippet=True),
+            }
+            results.append(result)
+        
+        return json_response(results)
+    except Exception as e:
+        logger.error(f"Error searching products for {q!r}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/products/lookup", response_model=List[PartLookupResult])
+async def lookup_part_number(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50)
+):
+    """Find products by OEM part number, tolerating dashes, spaces and typos"""
+    query_key = normalize_key(q)
+    if len(query_key) < 2:
+        raise HTTPException(status_code=400, detail="Part number must contain at least 2 letters or digits")
+    
+    try:
+        db = get_database()
+        
+        # Exact matches on the normalised key come first
+        exact = [
+            product async for product in db.admin_products.find(
+                part_number_exact(query_key),
+                {"_id": 0, "lookup_trigrams": 0}
+            ).limit(limit)
+        ]
+        
+        # Then the products sharing the most trigrams, re-ranked by similarity.
+        # Candidates are scored on the lookup fields alone; only the winners
+        # are fetched in full
+        query_grams = sorted(trigrams(query_key))
+        candidates = [
+            product async for product in db.admin_products.aggregate([
+                {"$match": part_number_candidates(query_grams)},
+                {"$project": {
+                    "_id": 0, "id": 1, "name": 1, "part_number_key": 1,
+                    "overlap": {"$size": {"$setIntersection": ["$lookup_trigrams", query_grams]}},
+                }},
+                {"$sort": {"overlap": -1}},
+                {"$limit": CANDIDATE_POOL},
+            ])
+        ]
+        
+        exact_ids = {product["id"] for product in exact}
+        ranked = rank(query_key, [c for c in candidates if c["id"] not in exact_ids], limit - len(exact))
+        winners = {
+            product["id"]: product async for product in db.admin_products.find(
+                products_by_ids([match["id"] for match in ranked]),
+                {"_id": 0, "lookup_trigrams": 0}
+            )
+        }
+        matches = [{**product, "match_score": 1.0} for product in exact]
+        matches += [
+            {**winners[match["id"]], "match_score": match["match_score"]}
+            for match in ranked if match["id"] in winners
+        ]
+        
+        results = []
+        for match in matches:
+            score = match.pop("match_score")
+            result = from_document(ProductItem, {k: v for k, v in match.items() if k not in INTERNAL_FIELDS})
+            result["match_score"] = score
+            results.append(result)
+        
+        return json_response(results)
+    except Exception as e:
+        logger.error(f"Error looking up part number {q!r}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+# Lower bounds of the price range facet buckets; the last one is open-ended
+PRICE_FACET_BOUNDARIES = [0, 1_000, 5_000, 10_000, 50_000, 100_000, 500_000, 1_000_000]
+
+FACET_SORTS = {
+    "newest": [("created_at", -1), ("id", -1)],
+    "price_asc": [("price_amount", 1), ("id", 1)],
+    "price_desc": [("price_amount", -1), ("id", -1)],
+}
+PRICE_SORTS = ("price_asc", "price_desc")
+
+def count_by(field: str) -> List[dict]:
+    """Facet stages counting documents per value of ``field``, most common first"""
+    return [{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}, {"$sort": {"count": -1, "_id": 1}}]
+
+def price_buckets() -> List[dict]:
+    """Facet stages counting priced documents per currency and PRICE_FACET_BOUNDARIES range.
+
+    Amounts in different currencies are never counted together.
+    """
+    lower_bound = {"$switch": {
+        "branches": [
+            {"case": {"$gte": ["$price_amount", boundary]}, "then": boundary}
+            for boundary in reversed(PRICE_FACET_BOUNDARIES)
+        ],
+        "default": PRICE_FACET_BOUNDARIES[0],
+    }}
+    return [
+        {"$match": {"price_amount": {"$ne": None}}},
+        {"$group": {"_id": {"currency": "$price_currency", "min": lower_bound}, "count": {"$sum": 1}}},
+        {"$sort": {"_id.currency": 1, "_id.min": 1}},
+    ]
+
+def price_bucket_value(bucket: dict) -> dict:
+    """A price range facet value: its currency and bounds, max None for the open top range"""
+    upper = [boundary for boundary in PRICE_FACET_BOUNDARIES if boundary > bucket["min"]]
+    return {"currency": bucket["currency"], "min": bucket["min"], "max": upper[0] if upper else None}
+
+@router.get("/products/facets", response_model=ProductFacetResult)
+async def get_product_facets(
+    category_id: Optional[str] = None,
+    available: Optional[bool] = None,
+    featured: Optional[bool] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    currency: Optional[str] = Query(None, min_length=3, max_length=3),
+    sort: str = Query("newest", pattern="^(newest|price_asc|price_desc)$"),
+    limit: int = Query(24, ge=1, le=MAX_PAGE_SIZE)
+):
+    """Filter products by category, availability, featured and price, with facet counts"""
+    try:
+        # Amounts are only comparable within one currency
+        if not currency and (min_price is not None or max_price is not None or sort in PRICE_SORTS):
+            raise HTTPException(status_code=400, detail="Price ranges and price sorts require a currency")
+        
+        db = get_database()
+        
+        filter_query = product_facets(category_id, available, featured, min_price, max_price, currency)
+        
+        # One round trip: the $match uses the compound indexes, $facet fans out
+        pipeline = [
+            {"$match": filter_query},
+            {"$facet": {
+                "total": [{"$count": "count"}],
+                "items": [
+                    {"$sort": dict(FACET_SORTS[sort])},
+                    {"$limit": limit},
+                    {"$project": {"_id": 0, **{name: 0 for name in INTERNAL_FIELDS}}},
+                ],
+                "category_id": count_by("category_id"),
+                "is_available": count_by("is_available"),
+                "is_featured": count_by("is_featured"),
+                "price_currency": count_by("price_currency"),
+                "price_range": price_buckets(),
+            }},
+        ]
+        
+        result = (await db.admin_products.aggregate(pipeline).to_list(length=1))[0]
+        
+        facets = {
+            name: [{"value": bucket["_id"], "count": bucket["count"]} for bucket in result[name]]
+            for name in ("category_id", "is_available", "is_featured", "price_currency")
+        }
+        facets["price_range"] = [
+            {"value": price_bucket_value(bucket["_id"]), "count": bucket["count"]} for bucket in result["price_range"]
+        ]
+        return json_response({
+            "total": result["total"][0]["count"] if result["total"] else 0,
+            "items": [from_document(ProductItem, product) for product in result["items"]],
+            "facets": facets,
+        })
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching product facets: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @router.get("/products/sample/{category_id}")
 async def get_sample_products(category_id: str):
     """Get sample products for display - now returns empty for clean start"""
@@ -81,8 +349,7 @@ async def get_sample_products(category_id: str):
 @router.post("/contact/inquiry", response_model=SuccessResponse)
 async def create_contact_inquiry(
     inquiry: ContactInquiryCreate,
-    request: Request,
-    background_tasks: BackgroundTasks
+    request: Request
 ):
     """Submit a contact inquiry"""
     try:
@@ -102,13 +369,12 @@ async def create_contact_inquiry(
         })
         
         inquiry_obj = ContactInquiry(**inquiry_data)
-        inquiry_dict = inquiry_obj.dict()
+        inquiry_dict = to_document(inquiry_obj)
         
-        # Save to database
-        result = await db.inquiries.insert_one(inquiry_dict)
-        
-        # Schedule background email notification (placeholder for now)
-        background_tasks.add_task(send_inquiry_notification, inquiry_obj)
+        # Save to database, queueing the email notification for the outbox worker
+        await insert_with_message(
+            db, "inquiries", inquiry_dict, inquiry_message_kind(inquiry_obj.inquiry_type), inquiry_obj.model_dump()
+        )
         
         return SuccessResponse(
             message="Thank you for your inquiry! We will contact you within 24 hours.",
@@ -119,63 +385,122 @@ async def create_contact_inquiry(
         raise HTTPException(status_code=500, detail="Failed to submit inquiry")
 
 @router.get("/contact/inquiries", response_model=List[ContactInquiry])
-async def get_contact_inquiries(status: Optional[str] = None, limit: int = 50):
-    """Get contact inquiries (admin endpoint)"""
+async def get_contact_inquiries(
+    request: Request,
+    status: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    output: Optional[str] = Query(None, alias="format", pattern=OUTPUT_FORMATS),
+    fields: Optional[str] = None
+):
+    """Get contact inquiries, newest first (admin endpoint)"""
     try:
         db = get_database()
         
-        filter_query = {}
-        if status:
-            filter_query["status"] = status
+        filter_query = inquiries_filter(status)
         
+        fieldset = Fieldset(ContactInquiry, fields, always=("id", "created_at"))
+        page = KeysetPage(direction=-1)
+        query = db.inquiries.find(page.query(filter_query, cursor), fieldset.projection).sort(page.sort)
+        
+        fmt = stream_format(request, output)
+        if fmt:
+            if limit:
+                query = query.limit(limit)
+            return stream_response(
+                query, lambda inquiry: fieldset.select(from_document(fieldset.model, inquiry)), fmt
+            )
+        
+        limit = limit or 50
         inquiries = []
-        async for inquiry in db.inquiries.find(filter_query, {"_id": 0}).limit(limit):
-            inquiries.append(ContactInquiry(**inquiry))
+        async for inquiry in query.limit(limit):
+            inquiries.append(from_document(fieldset.model, inquiry))
         
-        return inquiries
+        next_cursor = page.next_cursor(inquiries, limit)
+        return json_response([fieldset.select(inquiry) for inquiry in inquiries], headers=page_headers(next_cursor))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching inquiries: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 # Testimonials Endpoints
 @router.get("/testimonials", response_model=List[Testimonial])
-async def get_testimonials(featured_only: bool = True):
+async def get_testimonials(request: Request, featured_only: bool = True, fields: Optional[str] = None):
     """Get testimonials"""
+    fieldset = Fieldset(Testimonial, fields)
     try:
-        db = get_database()
-        
-        filter_query = {"is_active": True}
-        if featured_only:
-            filter_query["is_featured"] = True
-        
-        testimonials = []
-        async for testimonial in db.testimonials.find(filter_query, {"_id": 0}):
-            testimonials.append(Testimonial(**testimonial))
-        
-        return testimonials
+        testimonials = await catalog_cache.get(
+            "testimonials", featured_only, rendered(testimonials_loader(featured_only))
+        )
+        return catalog_response(request, testimonials, fieldset)
     except Exception as e:
         logger.error(f"Error fetching testimonials: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 # Why Choose Us Endpoints
 @router.get("/advantages", response_model=List[Advantage])
-async def get_advantages():
+async def get_advantages(request: Request, fields: Optional[str] = None):
     """Get competitive advantages"""
+    fieldset = Fieldset(Advantage, fields)
     try:
-        db = get_database()
-        
-        advantages = []
-        async for advantage in db.advantages.find(
-            {"is_active": True}, 
-            {"_id": 0}
-        ).sort("order", 1):
-            advantages.append(Advantage(**advantage))
-        
-        return advantages
+        advantages = await catalog_cache.get("advantages", None, rendered(load_advantages))
+        return catalog_response(request, advantages, fieldset)
     except Exception as e:
         logger.error(f"Error fetching advantages: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+# Bundle Endpoints
+# Each part resolves to an already-rendered catalog response, so a bundle is
+# assembled from cached bytes without re-encoding anything.
+BUNDLE_PARTS = {
+    "company_info": lambda: catalog_cache.get("company_info", None, rendered(load_company_info)),
+    "categories": lambda: catalog_cache.get("product_categories", None, rendered(load_product_categories)),
+    "testimonials": lambda: catalog_cache.get("testimonials", True, rendered(testimonials_loader(True))),
+    "advantages": lambda: catalog_cache.get("advantages", None, rendered(load_advantages)),
+}
+
+HOME_BUNDLE = ("company_info", "categories", "testimonials", "advantages")
+
+async def build_bundle(parts: List[str]) -> RenderedResponse:
+    """Fetch the requested parts concurrently and join them into one JSON object"""
+    results = await asyncio.gather(*(BUNDLE_PARTS[part]() for part in parts))
+    body = b"{" + b",".join(
+        b'"' + part.encode() + b'":' + result.body for part, result in zip(parts, results)
+    ) + b"}"
+    return RenderedResponse(dict(zip(parts, (result.data for result in results))), body)
+
+@router.get("/bundle/home")
+async def get_home_bundle(request: Request):
+    """Get everything the homepage needs in a single response"""
+    try:
+        return cached_response(request, await build_bundle(list(HOME_BUNDLE)), CATALOG_CACHE_POLICY)
+    except Exception as e:
+        logger.error(f"Error building home bundle: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/bundle")
+async def get_bundle(request: Request, parts: str):
+    """Get a custom combination of catalog data, e.g. ?parts=company_info,advantages"""
+    requested = list(dict.fromkeys(part.strip() for part in parts.split(",") if part.strip()))
+    unknown = [part for part in requested if part not in BUNDLE_PARTS]
+    if not requested or unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown bundle parts: {', '.join(unknown) or parts}. Available: {', '.join(BUNDLE_PARTS)}"
+        )
+    
+    try:
+        return cached_response(request, await build_bundle(requested), CATALOG_CACHE_POLICY)
+    except Exception as e:
+        logger.error(f"Error building bundle {requested}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Get catalog cache hit/miss counters"""
+    return catalog_cache.stats()
+
 # Statistics Endpoint
 @router.get("/stats")
 async def get_stats():
@@ -216,7 +541,7 @@ async def create_customer_rating(
         })
         
         rating_obj = CustomerRating(**rating_data)
-        rating_dict = rating_obj.dict()
+        rating_dict = to_document(rating_obj)
         
         # Save to database
         await db.customer_ratings.insert_one(rating_dict)
@@ -230,39 +555,86 @@ async def create_customer_rating(
         raise HTTPException(status_code=500, detail="Failed to submit rating")
 
 @router.get("/ratings", response_model=List[CustomerRating])
-async def get_customer_ratings(limit: int = 10, category: Optional[str] = None):
-    """Get customer ratings (public endpoint)"""
+async def get_customer_ratings(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    category: Optional[str] = None,
+    cursor: Optional[str] = None,
+    output: Optional[str] = Query(None, alias="format", pattern=OUTPUT_FORMATS),
+    fields: Optional[str] = None
+):
+    """Get customer ratings, newest first (public endpoint)"""
     try:
         db = get_database()
         
-        filter_query = {}
-        if category:
-            filter_query["service_category"] = category
+        filter_query = ratings_filter(category)
+        
+        fieldset = Fieldset(CustomerRating, fields, always=("id", "created_at"))
+        page = KeysetPage(direction=-1)
+        query = db.customer_ratings.find(page.query(filter_query, cursor), fieldset.projection).sort(page.sort)
+        
+        fmt = stream_format(request, output)
+        if fmt:
+            if limit:
+                query = query.limit(limit)
+            return stream_response(
+                query, lambda rating: fieldset.select(from_document(fieldset.model, rating)), fmt
+            )
         
+        limit = limit or 10
         ratings = []
-        async for rating in db.customer_ratings.find(
-            filter_query, 
-            {"_id": 0}
-        ).sort("created_at", -1).limit(limit):
-            ratings.append(CustomerRating(**rating))
+        async for rating in query.limit(limit):
+            ratings.append(from_document(fieldset.model, rating))
         
-        return ratings
+        next_cursor = page.next_cursor(ratings, limit)
+        return cached_response(
+            request, render([fieldset.select(rating) for rating in ratings]), RATINGS_CACHE_POLICY,
+            headers=page_headers(next_cursor)
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching ratings: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 # Admin Product Management Endpoints
 @router.get("/admin/products", response_model=List[ProductItem])
-async def get_admin_products():
-    """Get all products for admin management"""
+async def get_admin_products(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    output: Optional[str] = Query(None, alias="format", pattern=OUTPUT_FORMATS),
+    fields: Optional[str] = None
+):
+    """Get products for admin management, oldest first.
+
+    Pages of up to MAX_PAGE_SIZE by default; ?format=ndjson or json-stream
+    streams every product after the cursor instead (exports and syncs).
+    """
     try:
         db = get_database()
         
+        fieldset = Fieldset(ProductItem, fields, always=("id", "created_at"))
+        page = KeysetPage(direction=1)
+        query = db.admin_products.find(page.query({}, cursor), fieldset.projection).sort(page.sort)
+        
+        fmt = stream_format(request, output)
+        if fmt:
+            if limit:
+                query = query.limit(limit)
+            return stream_response(
+                query, lambda product: fieldset.select(from_document(fieldset.model, product)), fmt
+            )
+        
+        limit = limit or 100
         products = []
-        async for product in db.admin_products.find({}, {"_id": 0}):
-            products.append(ProductItem(**product))
+        async for product in query.limit(limit):
+            products.append(from_document(fieldset.model, product))
         
-        return products
+        next_cursor = page.next_cursor(products, limit)
+        return json_response([fieldset.select(product) for product in products], headers=page_headers(next_cursor))
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching admin products: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
@@ -273,8 +645,11 @@ async def create_admin_product(product: ProductItemCreate):
     try:
         db = get_database()
         
-        product_obj = ProductItem(**product.dict())
-        product_dict = product_obj.dict()
+        prices = price_fields(product.price)
+        product_obj = ProductItem(**product.dict(), **prices)
+        product_dict = to_document(product_obj)
+        product_dict.update(prices)
+        product_dict.update(lookup_fields(product_obj.name, product_obj.part_number))
         
         await db.admin_products.insert_one(product_dict)
         
@@ -311,6 +686,8 @@ async def update_admin_product(product_id: str, product: ProductItemCreate):
         db = get_database()
         
         update_data = product.dict()
+        update_data.update(price_fields(product.price))
+        update_data.update(lookup_fields(product.name, product.part_number))
         update_data["updated_at"] = datetime.utcnow()
         
         result = await db.admin_products.update_one(
@@ -328,73 +705,77 @@ async def update_admin_product(product_id: str, product: ProductItemCreate):
         logger.error(f"Error updating product: {e}")
         raise HTTPException(status_code=500, detail="Failed to update product")
 
+# Index Management Endpoints
+@router.get("/admin/indexes")
+async def get_index_report():
+    """Compare database indexes with the declared registry without changing anything"""
+    try:
+        return await reconcile_indexes(get_database(), create=False)
+    except Exception as e:
+        logger.error(f"Error checking indexes: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.post("/admin/indexes/reconcile")
+async def reconcile_database_indexes(drop_extra: bool = False):
+    """Create missing indexes and optionally drop undeclared ones (admin only)"""
+    try:
+        return await reconcile_indexes(get_database(), drop_extra=drop_extra)
+    except Exception as e:
+        logger.error(f"Error reconciling indexes: {e}")
+        raise HTTPException(status_code=500, detail="Failed to reconcile indexes")
+
+@router.get("/admin/outbox")
+async def get_outbox_stats():
+    """Count outbox messages by delivery status (admin only)"""
+    try:
+        return await outbox_stats(get_database())
+    except Exception as e:
+        logger.error(f"Error reading outbox stats: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.get("/admin/images/cache")
+async def get_image_cache_stats():
+    """Size and hit rate of the image transform cache (admin only)"""
+    return transform_cache.stats()
+
+@router.get("/admin/images/stats")
+async def get_image_serving_stats(limit: int = Query(20, ge=1, le=500)):
+    """Most requested image files and how often memory served them (admin only)"""
+    return {"memory_cache": hot_files.stats(), "files": file_metrics.top(limit)}
+
 # File Upload Endpoints
-@router.post("/upload/images", response_model=SuccessResponse)
-async def upload_multiple_images(files: List[UploadFile] = File(...)):
+@router.post("/upload/images", response_model=SuccessResponse, openapi_extra=UPLOAD_OPENAPI)
+async def upload_multiple_images(request: Request):
     """Upload multiple image files for products"""
     try:
-        if len(files) > 10:  # Limit to 10 images per upload
-            raise HTTPException(status_code=400, detail="Maximum 10 images allowed per upload")
-        
-        uploaded_files = []
-        errors = []
-        
-        for file in files:
-            try:
-                # Validate file type
-                if not file.content_type.startswith('image/'):
-                    errors.append(f"{file.filename}: Must be an image file")
-                    continue
-                
-                # Read and validate file size
-                content = await file.read()
-                file_size = len(content)
-                
-                if file_size > 5 * 1024 * 1024:  # 5MB
-                    errors.append(f"{file.filename}: File size must be less than 5MB")
-                    continue
-                
-                # Generate unique filename
-                file_extension = os.path.splitext(file.filename)[1].lower()
-                unique_filename = f"{uuid.uuid4()}{file_extension}"
-                file_path = UPLOAD_DIR / unique_filename
-                
-                # Save file
-                with open(file_path, "wb") as buffer:
-                    buffer.write(content)
-                
-                # Add to successful uploads
-                file_url = f"/api/uploads/{unique_filename}"
-                uploaded_files.append({
-                    "file_url": file_url,
-                    "filename": unique_filename,
-                    "original_name": file.filename,
-                    "size": file_size
-                })
-                
-                # Reset file position for next file
-                await file.seek(0)
-                
-            except Exception as e:
-                errors.append(f"{file.filename}: {str(e)}")
-                continue
+        # Files are streamed to disk while the body arrives and stored by content hash
+        upload = await ImageUpload.receive(request, get_database())
+        uploaded_files = upload.files
+        errors = upload.errors
         
         if not uploaded_files and errors:
             raise HTTPException(status_code=400, detail=f"No files uploaded successfully. Errors: {'; '.join(errors)}")
+        if not upload.total:
+            raise HTTPException(status_code=400, detail="No image files provided")
         
         logger.info(f"Bulk upload completed: {len(uploaded_files)} successful, {len(errors)} errors")
+
+        # Resized variants are rendered in the background, off the request path
+        for uploaded_file in uploaded_files:
+            if not uploaded_file["deduplicated"]:
+                schedule_variants(uploaded_file["filename"])
         
         response_data = {
             "uploaded_files": uploaded_files,
             "upload_count": len(uploaded_files),
-            "total_files": len(files)
+            "total_files": upload.total
         }
         
         if errors:
             response_data["errors"] = errors
         
         return SuccessResponse(
-            message=f"Successfully uploaded {len(uploaded_files)} out of {len(files)} images",
+            message=f"Successfully uploaded {len(uploaded_files)} out of {upload.total} images",
             data=response_data
         )
         
@@ -404,14 +785,53 @@ async def upload_multiple_images(files: List[UploadFile] = File(...)):
         logger.error(f"Error in bulk upload: {e}")
         raise HTTPException(status_code=500, detail="Failed to upload images")
 
+@router.head("/upload/images/{sha256}")
+async def check_image(sha256: str):
+    """Tell a client whether an image with this SHA-256 is already stored"""
+    try:
+        db = get_database()
+        record = await db.images.find_one(image_by_digest(sha256.lower()), {"_id": 0, "filename": 1})
+        if record is None or not await asyncio.to_thread(locate, record["filename"]):
+            return Response(status_code=404)
+        return Response(headers={
+            "Location": f"/api/uploads/{record['filename']}",
+            "X-Image-Filename": record["filename"]
+        })
+    except Exception as e:
+        logger.error(f"Error checking image {sha256}: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@router.post("/upload/images/refs", response_model=SuccessResponse)
+async def reference_images(references: ImageReferences):
+    """Reuse already stored images by SHA-256 instead of uploading them again"""
+    try:
+        uploaded_files, missing = await add_references(get_database(), references.sha256)
+        return SuccessResponse(
+            message=f"Referenced {len(uploaded_files)} out of {len(references.sha256)} images",
+            data={"uploaded_files": uploaded_files, "missing": missing}
+        )
+    except Exception as e:
+        logger.error(f"Error referencing images: {e}")
+        raise HTTPException(status_code=500, detail="Failed to reference images")
+
 @router.delete("/upload/image/{filename}", response_model=SuccessResponse)
 async def delete_image(filename: str):
-    """Delete an uploaded image file"""
+    """Release an uploaded image; the file is deleted once nothing references it"""
     try:
-        file_path = UPLOAD_DIR / filename
-        
-        if file_path.exists():
-            os.remove(file_path)
+        remaining = await release(get_database(), filename)
+        if remaining == 0:
+            await asyncio.to_thread(remove_variants, filename)
+            hot_files.invalidate(filename)
+        if remaining is not None:
+            return SuccessResponse(message="Image deleted successfully", data={"remaining_references": remaining})
+
+        # Files uploaded before content addressing have no reference count
+        if ".." in filename or "\\" in filename or filename.startswith("."):
+            raise HTTPException(status_code=400, detail="Invalid filename")
+        if await asyncio.to_thread(locate, filename):
+            await asyncio.to_thread(unlink_stored, filename)
+            await asyncio.to_thread(remove_variants, filename)
+            hot_files.invalidate(filename)
             return SuccessResponse(message="Image deleted successfully")
         else:
             raise HTTPException(status_code=404, detail="Image not found")
@@ -422,23 +842,66 @@ async def delete_image(filename: str):
         logger.error(f"Error deleting file: {e}")
         raise HTTPException(status_code=500, detail="Failed to delete image")
 
+VARIANT_PATTERN = f"^({'|'.join(VARIANTS)})$"
+FIT_PATTERN = f"^({'|'.join(FITS)})$"
+FORMAT_PATTERN = f"^(auto|{'|'.join(TRANSFORM_FORMATS)})$"
+
 @router.get("/uploads/{filename}")
-async def serve_uploaded_file(filename: str):
+async def serve_uploaded_file(
+    request: Request,
+    filename: str,
+    size: Optional[str] = Query(None, pattern=VARIANT_PATTERN, description="Resized variant: thumb, card or full"),
+    width: Optional[int] = Query(None, ge=1, le=MAX_DIMENSION, description="Transform: width in pixels"),
+    height: Optional[int] = Query(None, ge=1, le=MAX_DIMENSION, description="Transform: height in pixels"),
+    fit: str = Query("cover", pattern=FIT_PATTERN, description="Transform with width and height: cover crops, contain letterboxes, fill stretches"),
+    quality: int = Query(80, ge=1, le=100, description="Transform: WebP/JPEG quality"),
+    image_format: Optional[str] = Query(None, alias="format", pattern=FORMAT_PATTERN, description="Transform: output format, auto picks by Accept")
+):
     """Serve uploaded image files"""
     try:
-        file_path = UPLOAD_DIR / filename
-        
-        if not file_path.exists():
-            raise HTTPException(status_code=404, detail="File not found")
-        
-        # Security check: ensure filename doesn't contain path traversal
+        # Security check first: ensure filename doesn't contain path traversal
         if ".." in filename or "/" in filename or "\\" in filename:
             raise HTTPException(status_code=400, detail="Invalid filename")
+        # Uploads still being written are hidden
+        if filename.startswith("."):
+            raise HTTPException(status_code=404, detail="File not found")
         
-        return FileResponse(
-            path=file_path,
-            media_type="image/jpeg",  # Will be overridden by FastAPI based on file extension
-            filename=filename
+        # Sharded location first; files not migrated yet are still flat. The
+        # sharded path is tried again in case the migration just moved the file
+        file_path = stored_path(filename)
+        fallbacks = (flat_path(filename), file_path)
+        accept = request.headers.get("accept", "")
+        
+        if width or height or image_format:
+            if size:
+                raise HTTPException(status_code=400, detail="Use either size or transform parameters")
+            source = await asyncio.to_thread(locate, filename)
+            if source is None:
+                raise HTTPException(status_code=404, detail="File not found")
+            # Rendered once per parameter set, then served from the transform cache
+            path, transformed_type = await transform(
+                filename, source, width, height, fit, quality, image_format or "auto", accept
+            )
+            headers = {"Vary": "Accept"} if image_format in (None, "auto") else None
+            return await file_response(request, path, transformed_type, IMAGE_CACHE_POLICY, headers=headers)
+        
+        if size:
+            # WebP or JPEG by Accept header, so the response varies with it
+            variant = find_variant(filename, size, accept)
+            if variant:
+                return await file_response(request, variant[0], variant[1], IMAGE_CACHE_POLICY, headers={"Vary": "Accept"})
+            # Not rendered yet (or uploaded before variants existed): serve the original
+            # meanwhile, cached briefly since this URL will soon answer with the variant
+            response = await file_response(
+                request, file_path, media_type(filename), PENDING_IMAGE_CACHE_POLICY,
+                headers={"Vary": "Accept", **disposition_headers(filename)}, fallbacks=fallbacks
+            )
+            schedule_variants(filename)
+            return response
+        
+        return await file_response(
+            request, file_path, media_type(filename), IMAGE_CACHE_POLICY, etag=content_etag(filename),
+            headers=disposition_headers(filename), fallbacks=fallbacks
         )
         
     except HTTPException:
@@ -447,17 +910,5 @@ async def serve_uploaded_file(filename: str):
         logger.error(f"Error serving file: {e}")
         raise HTTPException(status_code=500, detail="Failed to serve file")
 
-# Background Tasks
-async def send_inquiry_notification(inquiry: ContactInquiry):
-    """Send email notification for new inquiry using email service"""
-    try:
-        success = await email_service.send_contact_email(inquiry)
-        if success:
-            logger.info(f"✅ Email notification sent for inquiry {inquiry.id}")
-        else:
-            logger.error(f"❌ Failed to send email notification for inquiry {inquiry.id}")
-    except Exception as e:
-        logger.error(f"❌ Error sending inquiry notification: {e}")
-
-# Email Functions (Remove the old placeholder function)
-# The old send_contact_email function is replaced by email_service.send_contact_email
\ No newline at end of file
+# Email notifications are queued in the outbox collection and delivered by
+# outbox_worker.py, which runs as its own process
\ No newline at end of file
@@ -0,0 +1,47 @@
+import html
+import re
+from typing import List, Optional
+
+# Characters of description context shown around the first match
+SNIPPET_LENGTH = 160
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def query_terms(q: str) -> List[str]:
+    """Distinct lowercase words of a search query, in order"""
+    return list(dict.fromkeys(word.lower() for word in _WORD.findall(q)))
+
+
+def _pattern(terms: List[str]) -> Optional[re.Pattern]:
+    if not terms:
+        return None
+    # The text index stems words, so "pumps" must highlight for "pump" too
+    alternatives = "|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True))
+    return re.compile(rf"\b(?:{alternatives})\w*", re.IGNORECASE | re.UNICODE)
+
+
+def highlight(text: str, terms: List[str], snippet: bool = False) -> str:
+    """HTML-escape ``text`` and wrap matched words in <mark>.
+
+    With ``snippet`` set, only a window of SNIPPET_LENGTH characters around
+    the first match is returned.
+    """
+    pattern = _pattern(terms)
+    if snippet and len(text) > SNIPPET_LENGTH:
+        match = pattern.search(text) if pattern else None
+        start = max(0, (match.start() if match else 0) - SNIPPET_LENGTH // 4)
+        end = start + SNIPPET_LENGTH
+        text = ("…" if start else "") + text[start:end] + ("…" if end < len(text) else "")
+
+    if not pattern:
+        return html.escape(text)
+
+    parts = []
+    last = 0
+    for match in pattern.finditer(text):
+        parts.append(html.escape(text[last:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group(0))}</mark>")
+        last = match.end()
+    parts.append(html.escape(text[last:]))
+    return "".join(parts)
@@ -0,0 +1,89 @@
+import logging
+from typing import Any, AsyncIterator, Callable, Optional
+
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(data: Any) -> bytes:
+    """Encode models, dicts and lists straight to JSON bytes"""
+    return orjson.dumps(data, default=_default)
+
+
+def json_response(data: Any, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    """Return already-built data without FastAPI's response_model validation pass"""
+    return Response(content=dumps(data), status_code=status_code, media_type="application/json", headers=headers)
+
+
+# Streaming listings
+NDJSON = "ndjson"
+JSON_STREAM = "json-stream"
+STREAM_FORMATS = (NDJSON, JSON_STREAM)
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+# Documents are coalesced into chunks of about this size before each send
+STREAM_CHUNK_SIZE = 64 * 1024
+# Documents fetched from Mongo per getMore while streaming
+STREAM_BATCH_SIZE = 500
+
+
+def stream_format(request: Request, requested: Optional[str]) -> Optional[str]:
+    """Pick a streaming format from ?format= or the Accept header, None for a normal response"""
+    if requested in STREAM_FORMATS:
+        return requested
+    if requested is None and NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return NDJSON
+    return None
+
+
+async def _iter_chunks(cursor, transform: Callable[[dict], Any], fmt: str) -> AsyncIterator[bytes]:
+    """Encode documents as the cursor yields them, one chunk at a time.
+
+    The response awaits each send, so a slow client stops us pulling further
+    batches from Mongo and memory stays bounded by one batch plus one chunk.
+    """
+    buffer = bytearray(b"[" if fmt == JSON_STREAM else b"")
+    first = True
+    try:
+        async for document in cursor:
+            if fmt == JSON_STREAM:
+                if not first:
+                    buffer += b","
+                buffer += dumps(transform(document))
+            else:
+                buffer += dumps(transform(document)) + b"\n"
+            first = False
+            if len(buffer) >= STREAM_CHUNK_SIZE:
+                yield bytes(buffer)
+                buffer.clear()
+        if fmt == JSON_STREAM:
+            buffer += b"]"
+        if buffer:
+            yield bytes(buffer)
+    except Exception as e:
+        # Headers are already sent; all we can do is stop and leave a truncated body
+        logger.error(f"Error while streaming documents: {e}")
+        raise
+    finally:
+        await cursor.close()
+
+
+def stream_response(cursor, transform: Callable[[dict], Any], fmt: str) -> StreamingResponse:
+    """Stream a Motor cursor as NDJSON or as a chunked JSON array"""
+    media_type = NDJSON_MEDIA_TYPE if fmt == NDJSON else "application/json"
+    return StreamingResponse(
+        _iter_chunks(cursor.batch_size(STREAM_BATCH_SIZE), transform, fmt),
+        media_type=media_type,
+    )
@@ -1,14 +1,21 @@
 from fastapi import FastAPI, APIRouter, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 import os
 from pathlib import Path
 from dotenv import load_dotenv
 
 # Import our modules
-from database import connect_to_mongo, close_mongo_connection
-from routes import router as api_routes
+from database import connect_to_mongo, close_mongo_connection, get_database
+from routes import router as api_routes, warm_catalog_cache
+from cache import catalog_cache
+from pagination import NEXT_CURSOR_HEADER
+from email_service import email_service
+import image_variants
+import outbox_worker
 
 # Setup logging
 logging.basicConfig(
@@ -33,14 +40,31 @@ async def lifespan(app: FastAPI):
     try:
         await connect_to_mongo()
         logger.info("Database connected successfully")
+        catalog_cache.start(get_database())
+        await warm_catalog_cache()
+        logger.info("Catalog cache warmed")
     except Exception as e:
         logger.error(f"Database connection failed: {e}")
         raise
     
+    # Queued notifications are delivered by outbox_worker.py, unless this
+    # process was explicitly asked to deliver them itself
+    outbox_stop = asyncio.Event()
+    outbox_task = None
+    if outbox_worker.WORKER_MODE == "embedded":
+        outbox_task = asyncio.create_task(outbox_worker.run_embedded(get_database(), outbox_stop))
+    
     yield  # Application runs here
     
     # Shutdown
     logger.info("Shutting down Sun Star International API...")
+    outbox_stop.set()
+    if outbox_task:
+        # In-flight deliveries finish; anything unacked is retried after its lease
+        await outbox_task
+    await email_service.close()
+    await catalog_cache.stop()
+    image_variants.shutdown()
     await close_mongo_connection()
     logger.info("Database disconnected successfully")
 
@@ -49,7 +73,8 @@ app = FastAPI(
     title="Sun Star International API",
     description="API for Sun Star International FZ-LLC trading company website",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Create API router with /api prefix
@@ -62,6 +87,7 @@ app.add_middleware(
     allow_origins=["*"],  # In production, specify exact origins
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Health check endpoint
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import time
+from email.message import Message
+from typing import List, Optional
+
+import aiosmtplib
+
+logger = logging.getLogger(__name__)
+
+# Errors after which a pooled connection is discarded and the send retried once
+RECONNECT_ERRORS = (
+    aiosmtplib.SMTPServerDisconnected,
+    aiosmtplib.SMTPConnectError,
+    aiosmtplib.SMTPTimeoutError,
+    ConnectionError,
+)
+
+
+class _Connection:
+    def __init__(self, smtp: aiosmtplib.SMTP):
+        self.smtp = smtp
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPPool:
+    """Small pool of persistent, authenticated aiosmtplib connections.
+
+    Connections are opened lazily, reused across messages and replaced when
+    the server drops them, when they have been idle longer than
+    ``idle_timeout`` or after ``max_messages`` sends (many providers cap
+    messages per session).
+    """
+
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        start_tls: bool = True,
+        use_tls: bool = False,
+        size: int = 2,
+        timeout: float = 10.0,
+        idle_timeout: float = 60.0,
+        max_messages: int = 100,
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.start_tls = start_tls
+        self.use_tls = use_tls
+        self.size = size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_messages = max_messages
+        self._idle: List[_Connection] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.connects = 0
+        self.reconnects = 0
+
+    async def _connect(self) -> _Connection:
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            username=self.username or None,
+            password=self.password or None,
+            start_tls=self.start_tls,
+            use_tls=self.use_tls,
+            timeout=self.timeout,
+        )
+        # connect() negotiates TLS and logs in when credentials are set
+        await smtp.connect()
+        self.connects += 1
+        return _Connection(smtp)
+
+    async def _discard(self, connection: _Connection):
+        try:
+            if connection.smtp.is_connected:
+                await asyncio.wait_for(connection.smtp.quit(), self.timeout)
+        except Exception:
+            connection.smtp.close()
+
+    async def _checkout(self) -> _Connection:
+        while self._idle:
+            connection = self._idle.pop()
+            stale = time.monotonic() - connection.last_used > self.idle_timeout
+            if connection.smtp.is_connected and not stale and connection.sent < self.max_messages:
+                return connection
+            await self._discard(connection)
+        return await self._connect()
+
+    async def send(self, message: Message):
+        """Send ``message`` over a pooled connection, reconnecting once if it went stale"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+
+        async with self._slots:
+            connection = await self._checkout()
+            try:
+                try:
+                    await connection.smtp.send_message(message)
+                except RECONNECT_ERRORS as e:
+                    logger.info(f"SMTP connection lost ({e}), reconnecting")
+                    self.reconnects += 1
+                    await self._discard(connection)
+                    connection = await self._connect()
+                    await connection.smtp.send_message(message)
+            except Exception:
+                await self._discard(connection)
+                raise
+
+            connection.sent += 1
+            connection.last_used = time.monotonic()
+            self._idle.append(connection)
+
+    async def close(self):
+        """Quit every idle connection"""
+        idle, self._idle = self._idle, []
+        await asyncio.gather(*(self._discard(connection) for connection in idle))
@@ -0,0 +1,499 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from PIL import Image, UnidentifiedImageError
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from queries import image_by_digest, referenced_image
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+logger = logging.getLogger(__name__)
+
+# Create uploads directory if it doesn't exist
+UPLOAD_DIR = Path("uploads")
+UPLOAD_DIR.mkdir(exist_ok=True)
+
+# Files are spread over UPLOAD_DIR/ab/cd/ by a hash of their name, so no
+# directory grows past a few thousand entries. Files stored before this
+# stay flat in UPLOAD_DIR until migrate_uploads.py moves them, and are
+# still found there meanwhile.
+SHARD_DEPTH = 2
+
+UPLOAD_FIELD = "files"
+MAX_FILES = 10
+MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
+# Boundaries and part headers on top of the file bytes themselves
+MULTIPART_OVERHEAD = 64 * 1024
+MAX_REQUEST_SIZE = MAX_FILES * MAX_FILE_SIZE + MULTIPART_OVERHEAD
+
+# Disk writes are issued in chunks of this size, whatever the network read size
+WRITE_CHUNK_SIZE = 256 * 1024
+
+# File writes for every upload in the process share this bounded pool
+UPLOAD_WRITERS = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("UPLOAD_WRITE_THREADS", "4")),
+    thread_name_prefix="upload-writer"
+)
+
+# The upload route reads the body itself, so describe it for the API docs
+UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": [UPLOAD_FIELD],
+                    "properties": {
+                        UPLOAD_FIELD: {"type": "array", "items": {"type": "string", "format": "binary"}}
+                    },
+                }
+            }
+        },
+    }
+}
+
+
+def _decode(value: bytes) -> str:
+    try:
+        return value.decode("utf-8")
+    except UnicodeDecodeError:
+        return value.decode("latin-1")
+
+
+class _Part:
+    def __init__(self):
+        self.headers: Dict[bytes, bytes] = {}
+        self.original_name = ""
+        self.temp_path: Optional[Path] = None
+        self.target = None
+        self.size = 0
+        self.hash = hashlib.sha256()
+        # Network reads are coalesced into WRITE_CHUNK_SIZE writes
+        self.buffer = bytearray()
+        # The part's previous write; chunks of one file are written in order
+        self.pending: Optional[asyncio.Future] = None
+        # Set once the stored image holds a reference for this part
+        self.record: Optional[Dict[str, Any]] = None
+
+    def open(self):
+        self.target = open(self.temp_path, "wb")
+
+    def write(self, data: bytes):
+        self.hash.update(data)
+        self.target.write(data)
+
+    def close(self, tail: bytes) -> str:
+        """Write the last bytes and close the temp file, returning the SHA-256"""
+        self.write(tail)
+        self.target.close()
+        self.target = None
+        return self.hash.hexdigest()
+
+    def discard(self):
+        if self.target:
+            self.target.close()
+            self.target = None
+        if self.temp_path:
+            self.temp_path.unlink(missing_ok=True)
+
+
+# Uploads are stored once per distinct content, named by their SHA-256, and
+# shared through a reference count in the images collection: every upload or
+# add_references() call takes a reference, every release() drops one, and the
+# file is deleted with the last reference.
+
+# Image formats accepted for upload, as identified from the file's own bytes
+# -> (stored extension, media type). The client's file name and Content-Type
+# are never trusted: they would decide how the file is served back.
+IMAGE_FORMATS = {
+    "JPEG": (".jpg", "image/jpeg"),
+    "PNG": (".png", "image/png"),
+    "WEBP": (".webp", "image/webp"),
+    "GIF": (".gif", "image/gif"),
+}
+
+
+def shard(filename: str) -> str:
+    digest = hashlib.md5(filename.encode(), usedforsecurity=False).hexdigest()
+    return "/".join(digest[2 * level:2 * level + 2] for level in range(SHARD_DEPTH))
+
+
+def stored_path(filename: str) -> Path:
+    """Where a file lives in the sharded layout"""
+    return UPLOAD_DIR / shard(filename) / filename
+
+
+def flat_path(filename: str) -> Path:
+    """Where a file lived before sharding"""
+    return UPLOAD_DIR / filename
+
+
+def locate(filename: str) -> Optional[Path]:
+    """The stored file for a name, in either layout"""
+    for path in (stored_path(filename), flat_path(filename), stored_path(filename)):
+        # Checked twice in case the migration moved it between the first two checks
+        if path.is_file():
+            return path
+    return None
+
+
+CONTENT_ADDRESSED = re.compile(r"^[0-9a-f]{64}\.")
+
+
+# Stored extension -> media type for the files served inline. Anything
+# else, such as .svg or .html files stored before uploads were identified
+# by their bytes, is only ever sent as an opaque download.
+INLINE_TYPES = {extension: content_type for extension, content_type in IMAGE_FORMATS.values()}
+INLINE_TYPES[".jpeg"] = "image/jpeg"
+DOWNLOAD_TYPE = "application/octet-stream"
+
+
+def media_type(filename: str) -> str:
+    return INLINE_TYPES.get(os.path.splitext(filename)[1].lower(), DOWNLOAD_TYPE)
+
+
+def disposition_headers(filename: str) -> Dict[str, str]:
+    """Make browsers save files that are not served inline rather than render them"""
+    if media_type(filename) == DOWNLOAD_TYPE:
+        return {"Content-Disposition": "attachment"}
+    return {}
+
+
+def content_etag(filename: str) -> Optional[str]:
+    """Strong ETag for a content-addressed upload: its hash, the same on every server"""
+    if CONTENT_ADDRESSED.match(filename):
+        return f'"{filename[:64]}"'
+    return None
+
+
+def identify_image(path: Path) -> Optional[str]:
+    """The IMAGE_FORMATS format of a file from its header, None for anything else"""
+    try:
+        with Image.open(path, formats=list(IMAGE_FORMATS)) as image:
+            return image.format
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        return None
+
+
+def file_entry(record: Dict[str, Any], original_name: Optional[str], deduplicated: bool) -> Dict[str, Any]:
+    return {
+        "file_url": f"/api/uploads/{record['filename']}",
+        "filename": record["filename"],
+        "original_name": original_name,
+        "size": record["size"],
+        "sha256": record["sha256"],
+        "deduplicated": deduplicated
+    }
+
+
+async def _in_pool(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(UPLOAD_WRITERS, func, *args)
+
+
+def _place(temp_path: Path, filename: str) -> bool:
+    """Move a finished temp file to its content address unless the bytes are already there.
+
+    Returns whether the temp file was placed.
+    """
+    if locate(filename):
+        temp_path.unlink(missing_ok=True)
+        return False
+    path = stored_path(filename)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(temp_path, path)
+    return True
+
+
+def unlink_stored(filename: str):
+    # Flat first: a migration moving the file concurrently leaves it sharded
+    flat_path(filename).unlink(missing_ok=True)
+    stored_path(filename).unlink(missing_ok=True)
+
+
+def _bury(filename: str) -> List[Tuple[Path, Path]]:
+    """Rename a stored file out of sight, returning (tombstone, original path) pairs"""
+    buried = []
+    # Flat first: a migration moving the file concurrently leaves it sharded
+    for path in (flat_path(filename), stored_path(filename)):
+        tombstone = path.with_name(f".{filename}.{uuid.uuid4()}.deleted")
+        try:
+            os.replace(path, tombstone)
+        except FileNotFoundError:
+            continue
+        buried.append((tombstone, path))
+    return buried
+
+
+def _unbury(buried: List[Tuple[Path, Path]], restore: bool):
+    for tombstone, path in buried:
+        if restore:
+            os.replace(tombstone, path)
+        else:
+            tombstone.unlink(missing_ok=True)
+
+
+async def store_image(db, temp_path: Path, digest: str, image_format: str, size: int):
+    """Take a reference to an upload's bytes, then make sure they are stored.
+
+    The reference comes first, so a concurrent release() of the last one
+    either sees it and keeps the file, or has already removed the file and
+    the temp file is placed in its stead. Returns the image record and
+    whether the bytes were already stored.
+    """
+    extension, content_type = IMAGE_FORMATS[image_format]
+    now = datetime.utcnow()
+    for attempt in range(2):
+        try:
+            record = await db.images.find_one_and_update(
+                image_by_digest(digest),
+                {
+                    "$inc": {"refs": 1},
+                    "$set": {"updated_at": now},
+                    "$setOnInsert": {
+                        "filename": f"{digest}{extension}", "size": size, "content_type": content_type, "created_at": now
+                    }
+                },
+                projection={"_id": 0},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            break
+        except DuplicateKeyError:
+            # A concurrent upload of the same bytes created the record first
+            if attempt:
+                raise
+
+    try:
+        # Placing the file even for a known digest restores one that went missing
+        placed = await _in_pool(_place, temp_path, record["filename"])
+    except BaseException:
+        await asyncio.shield(release(db, record["filename"]))
+        raise
+    return record, not placed
+
+
+async def add_references(db, digests: List[str]):
+    """Take a reference to already stored images, so clients can skip re-sending them.
+
+    Returns (file entries for known digests, digests that must be uploaded).
+    """
+    files, missing = [], []
+    for digest in dict.fromkeys(digest.lower() for digest in digests):
+        record = await db.images.find_one(image_by_digest(digest), {"_id": 0})
+        if record is None or not await _in_pool(locate, record["filename"]):
+            missing.append(digest)
+            continue
+        record = await db.images.find_one_and_update(
+            image_by_digest(digest),
+            {"$inc": {"refs": 1}, "$set": {"updated_at": datetime.utcnow()}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if record is None:
+            # Its last reference was released in the meantime
+            missing.append(digest)
+            continue
+        files.append(file_entry(record, None, True))
+    return files, missing
+
+
+async def release(db, filename: str) -> Optional[int]:
+    """Drop one reference to a stored image, deleting the file with the last one.
+
+    Returns the references left, or None for files not in the store
+    (uploaded before content addressing).
+    """
+    record = await db.images.find_one_and_update(
+        referenced_image(filename),
+        {"$inc": {"refs": -1}, "$set": {"updated_at": datetime.utcnow()}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if record is None:
+        return None
+    if record["refs"] <= 0:
+        # Only delete if nobody took a new reference in the meantime
+        deleted = await db.images.delete_one({"sha256": record["sha256"], "refs": {"$lte": 0}})
+        if deleted.deleted_count:
+            # An upload of the same bytes may have taken a new reference and
+            # found the file still there, so the file is only renamed away
+            # until the record is checked again
+            buried = await _in_pool(_bury, filename)
+            reused = await db.images.find_one(image_by_digest(record["sha256"]), {"_id": 1}) is not None
+            await _in_pool(_unbury, buried, reused)
+    return record["refs"]
+
+
+class ImageUpload:
+    """Images of one multipart request, streamed to UPLOAD_DIR as they arrive.
+
+    Each file is written chunk by chunk, so memory use is bounded by
+    WRITE_CHUNK_SIZE per file rather than the upload. A file is abandoned (and
+    its partial copy removed) the moment it crosses MAX_FILE_SIZE; the rest
+    of the request is still read so later files can be stored.
+
+    Disk I/O and hashing run on the UPLOAD_WRITERS thread pool, never on
+    the event loop. Files are written to a temporary name and moved to their
+    content address when complete, so a half-written image is never served;
+    finishing one file overlaps with receiving the next.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.files: List[Dict[str, Any]] = []
+        self.errors: List[str] = []
+        self.total = 0
+        self._part: Optional[_Part] = None
+        self._parts: List[_Part] = []
+        self._commits: List[asyncio.Future] = []
+
+    async def _run(self, func, *args):
+        return await _in_pool(func, *args)
+
+    @classmethod
+    async def receive(cls, request: Request, db) -> "ImageUpload":
+        content_type, params = parse_options_header(request.headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or b"boundary" not in params:
+            raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+        # Refuse oversized bodies before reading a single byte of them
+        length = request.headers.get("content-length", "")
+        if length.isdigit() and int(length) > MAX_REQUEST_SIZE:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds {MAX_REQUEST_SIZE // (1024 * 1024)}MB")
+
+        upload = cls(db)
+        events: List[tuple] = []
+        header_field = bytearray()
+        header_value = bytearray()
+
+        def on_header_field(data: bytes, start: int, end: int):
+            header_field.extend(data[start:end])
+
+        def on_header_value(data: bytes, start: int, end: int):
+            header_value.extend(data[start:end])
+
+        def on_header_end():
+            events.append(("header", (bytes(header_field).lower(), bytes(header_value))))
+            header_field.clear()
+            header_value.clear()
+
+        parser = MultipartParser(params[b"boundary"], {
+            "on_part_begin": lambda: events.append(("begin", None)),
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": lambda: events.append(("headers", None)),
+            "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+            "on_part_end": lambda: events.append(("end", None)),
+        })
+
+        received = 0
+        try:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > MAX_REQUEST_SIZE:
+                    # Chunked bodies carry no Content-Length to check up front
+                    raise HTTPException(status_code=413, detail=f"Upload exceeds {MAX_REQUEST_SIZE // (1024 * 1024)}MB")
+                parser.write(chunk)
+                await upload._handle(events)
+                events.clear()
+            parser.finalize()
+            await upload._handle(events)
+            upload.files = [entry for entry in await asyncio.gather(*upload._commits) if entry]
+        except BaseException:
+            await asyncio.shield(upload._abort())
+            raise
+        return upload
+
+    async def _handle(self, events: List[tuple]):
+        for event, value in events:
+            if event == "begin":
+                self._part = _Part()
+            elif event == "header":
+                self._part.headers[value[0]] = value[1]
+            elif event == "headers":
+                self._start(self._part)
+            elif event == "data":
+                await self._write(self._part, value)
+            elif event == "end":
+                self._finish(self._part)
+                self._part = None
+
+    def _start(self, part: _Part):
+        _, disposition = parse_options_header(part.headers.get(b"content-disposition", b""))
+        if _decode(disposition.get(b"name", b"")) != UPLOAD_FIELD or b"filename" not in disposition:
+            return
+
+        self.total += 1
+        if self.total > MAX_FILES:
+            raise HTTPException(status_code=400, detail=f"Maximum {MAX_FILES} images allowed per upload")
+
+        part.original_name = _decode(disposition[b"filename"])
+        if not _decode(part.headers.get(b"content-type", b"")).startswith("image/"):
+            self.errors.append(f"{part.original_name}: Must be an image file")
+            return
+
+        # The final name is the content hash and format, known once the last byte is in
+        part.temp_path = UPLOAD_DIR / f".{uuid.uuid4()}.part"
+        self._parts.append(part)
+        part.pending = asyncio.ensure_future(self._run(part.open))
+
+    async def _write(self, part: _Part, data: bytes):
+        if part.pending is None:
+            return
+        part.size += len(data)
+        if part.size > MAX_FILE_SIZE:
+            await part.pending
+            part.pending = None
+            part.buffer.clear()
+            await self._run(part.discard)
+            self.errors.append(f"{part.original_name}: File size must be less than 5MB")
+            return
+        part.buffer += data
+        if len(part.buffer) >= WRITE_CHUNK_SIZE:
+            # One write in flight per file: keeps chunks in order and memory bounded
+            await part.pending
+            part.pending = asyncio.ensure_future(self._run(part.write, bytes(part.buffer)))
+            part.buffer.clear()
+
+    def _finish(self, part: _Part):
+        if part.pending is None:
+            return
+        self._commits.append(asyncio.ensure_future(self._commit(part)))
+
+    async def _commit(self, part: _Part) -> Optional[Dict[str, Any]]:
+        await part.pending
+        tail, part.buffer = bytes(part.buffer), bytearray()
+        digest = await self._run(part.close, tail)
+        image_format = await self._run(identify_image, part.temp_path)
+        if image_format is None:
+            await self._run(part.discard)
+            self.errors.append(f"{part.original_name}: Must be a JPEG, PNG, WebP or GIF image")
+            return None
+        part.record, deduplicated = await store_image(self.db, part.temp_path, digest, image_format, part.size)
+        return file_entry(part.record, part.original_name, deduplicated)
+
+    async def _abort(self):
+        """Undo everything this request stored after a failure or disconnect"""
+        pending = [part.pending for part in self._parts if part.pending] + self._commits
+        await asyncio.gather(*pending, return_exceptions=True)
+        await asyncio.gather(*(self._run(part.discard) for part in self._parts), return_exceptions=True)
+        for part in self._parts:
+            if part.record:
+                await release(self.db, part.record["filename"])
+        self.files = []
@@ -1,6 +1,32 @@
 import { useState, useEffect } from 'react';
 import { api } from '../services/api';
 
+export const useHomeBundle = () => {
+  const [data, setData] = useState({ company_info: null, categories: [], testimonials: [], advantages: [] });
+  const [loading, setLoading] = useState(true);
+  const [error, setError] = useState(null);
+
+  useEffect(() => {
+    const fetchData = async () => {
+      try {
+        setLoading(true);
+        const result = await api.getHomeBundle();
+        setData(result);
+        setError(null);
+      } catch (err) {
+        setError(err.message);
+        console.error('Failed to fetch home bundle:', err);
+      } finally {
+        setLoading(false);
+      }
+    };
+
+    fetchData();
+  }, []);
+
+  return { data, loading, error };
+};
+
 export const useCompanyInfo = () => {
   const [data, setData] = useState(null);
   const [loading, setLoading] = useState(true);
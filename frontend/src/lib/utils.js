@@ -4,3 +4,11 @@ import { twMerge } from "tailwind-merge"
 export function cn(...inputs) {
   return twMerge(clsx(inputs));
 }
+
+// Resized variant ("thumb", "card" or "full") of an uploaded image; other URLs are returned unchanged
+export function imageVariant(url, size) {
+  if (!url || !url.includes("/api/uploads/") || url.includes("?")) {
+    return url;
+  }
+  return `${url}?size=${size}`;
+}
@@ -13,7 +13,9 @@ import {
 } from 'lucide-react';
 import { Link } from 'react-router-dom';
 import { useProductCategories } from '../hooks/useApi';
+import { api } from '../services/api';
 import ThemeToggle from '../components/ThemeToggle';
+import { imageVariant } from '../lib/utils';
 
 const AdminManager = () => {
   const [products, setProducts] = useState([]);
@@ -29,6 +31,7 @@ const AdminManager = () => {
     name: '',
     description: '',
     price: '',
+    part_number: '',
     image_urls: [], // Changed from image_url to image_urls array
     is_featured: false,
     is_available: true
@@ -41,8 +44,7 @@ const AdminManager = () => {
   const loadProducts = async () => {
     try {
       setLoading(true);
-      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/admin/products`);
-      const data = await response.json();
+      const data = await api.getAllAdminProducts();
       setProducts(data);
     } catch (error) {
       console.error('Failed to load products:', error);
@@ -108,6 +110,7 @@ const AdminManager = () => {
       name: product.name,
       description: product.description,
       price: product.price,
+      part_number: product.part_number || '',
       image_urls: product.image_urls || [], // Handle both old and new formats
       is_featured: product.is_featured,
       is_available: product.is_available
@@ -121,6 +124,7 @@ const AdminManager = () => {
       name: '',
       description: '',
       price: '',
+      part_number: '',
       image_urls: [],
       is_featured: false,
       is_available: true
@@ -369,6 +373,13 @@ const AdminManager = () => {
                     required
                   />
                   <p className="text-sm text-muted-foreground mt-2">💰 Write the price or "Contact for Price" if you prefer</p>
+                  <Input
+                    id="part_number"
+                    value={formData.part_number}
+                    onChange={(e) => setFormData(prev => ({ ...prev, part_number: e.target.value }))}
+                    placeholder="OEM part number (optional), e.g. 04152-YZZA1"
+                    className="h-12 text-base mt-4"
+                  />
                 </div>
 
                 {/* Step 5: Photos - MANDATORY */}
@@ -445,7 +456,7 @@ const AdminManager = () => {
                         {formData.image_urls.map((imageUrl, index) => (
                           <div key={index} className="relative group">
                             <img 
-                              src={imageUrl} 
+                              src={imageVariant(imageUrl, 'thumb')} 
                               alt={`Product preview ${index + 1}`} 
                               className="w-full h-32 object-cover rounded-lg border-2 border-border shadow-md"
                             />
@@ -575,7 +586,7 @@ const AdminManager = () => {
                       {product.image_urls && product.image_urls.length > 0 ? (
                         <>
                           <img 
-                            src={product.image_urls[0]} 
+                            src={imageVariant(product.image_urls[0], 'thumb')} 
                             alt={product.name}
                             className="w-full h-full object-cover"
                           />
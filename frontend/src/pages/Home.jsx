@@ -4,16 +4,15 @@ import { Button } from '../components/ui/button';
 import { Card, CardContent } from '../components/ui/card';
 import { Badge } from '../components/ui/badge';
 import { ArrowRight, Car, Wrench, Truck, Building2, Star, Quote, Loader2 } from 'lucide-react';
-import { useCompanyInfo, useProductCategories, useTestimonials } from '../hooks/useApi';
+import { useHomeBundle } from '../hooks/useApi';
 import { contactActions } from '../utils/contactUtils';
 import { heroImage } from '../mock';
 import { useNavigate } from 'react-router-dom';
 
 const Home = () => {
   const navigate = useNavigate();
-  const { data: companyInfo, loading: companyLoading, error: companyError } = useCompanyInfo();
-  const { data: productCategories, loading: productsLoading, error: productsError } = useProductCategories();
-  const { data: testimonials, loading: testimonialsLoading, error: testimonialsError } = useTestimonials();
+  const { data: homeData, loading, error } = useHomeBundle();
+  const { company_info: companyInfo, categories: productCategories, testimonials } = homeData;
 
   const quickNavItems = [
     { title: 'Cars', icon: Car, path: '/store?category=1', color: 'bg-primary/10 text-primary dark:bg-primary/20' },
@@ -22,7 +21,7 @@ const Home = () => {
   ];
 
   // Loading state
-  if (companyLoading || productsLoading || testimonialsLoading) {
+  if (loading) {
     return (
       <div className="min-h-screen bg-background flex items-center justify-center">
         <div className="flex items-center gap-2">
@@ -34,7 +33,7 @@ const Home = () => {
   }
 
   // Error state
-  if (companyError || productsError || testimonialsError) {
+  if (error) {
     return (
       <div className="min-h-screen bg-background flex items-center justify-center">
         <div className="text-center">
@@ -9,7 +9,9 @@ import {
   ImageIcon, Package, Loader2, Star
 } from 'lucide-react';
 import { useProductCategories, useCompanyInfo } from '../hooks/useApi';
+import { api } from '../services/api';
 import { contactActions } from '../utils/contactUtils';
+import { imageVariant } from '../lib/utils';
 
 const Store = () => {
   const navigate = useNavigate();
@@ -43,12 +45,7 @@ const Store = () => {
     try {
       setLoading(true);
       // Get products from admin panel only
-      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/admin/products`);
-      let adminProducts = [];
-      
-      if (response.ok) {
-        adminProducts = await response.json();
-      }
+      const adminProducts = await api.getAllAdminProducts();
 
       // Only show admin products - no sample products
       const allProducts = [];
@@ -215,7 +212,7 @@ const ProductCard = ({ product, companyInfo }) => {
         {product.image_urls && product.image_urls.length > 0 ? (
           <div className="relative w-full h-full">
             <img
-              src={product.image_urls[0]}
+              src={imageVariant(product.image_urls[0], 'card')}
               alt={product.name}
               className="w-full h-full object-cover group-hover:scale-105 transition-transform duration-300"
             />
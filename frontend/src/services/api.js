@@ -38,6 +38,12 @@ apiClient.interceptors.response.use(
 
 // API functions
 export const api = {
+  // Homepage bundle (company info, categories, testimonials and advantages in one request)
+  getHomeBundle: async () => {
+    const response = await apiClient.get('/bundle/home');
+    return response.data;
+  },
+
   // Company Information
   getCompanyInfo: async () => {
     const response = await apiClient.get('/company-info');
@@ -60,6 +66,43 @@ export const api = {
     return response.data;
   },
 
+  searchProducts: async (q, categoryId = null, limit = 20) => {
+    const response = await apiClient.get('/products/search', {
+      params: categoryId ? { q, category_id: categoryId, limit } : { q, limit }
+    });
+    return response.data;
+  },
+
+  // filters: { category_id, available, featured, min_price, max_price, currency, sort, limit }
+  getProductFacets: async (filters = {}) => {
+    const response = await apiClient.get('/products/facets', { params: filters });
+    return response.data;
+  },
+
+  lookupPartNumber: async (q, limit = 10) => {
+    const response = await apiClient.get('/products/lookup', { params: { q, limit } });
+    return response.data;
+  },
+
+  // Admin products are paginated; the next page's cursor comes back in X-Next-Cursor
+  getAdminProductsPage: async (cursor = null, limit = 100) => {
+    const response = await apiClient.get('/admin/products', {
+      params: cursor ? { cursor, limit } : { limit }
+    });
+    return { items: response.data, nextCursor: response.headers['x-next-cursor'] || null };
+  },
+
+  getAllAdminProducts: async () => {
+    const products = [];
+    let cursor = null;
+    do {
+      const page = await api.getAdminProductsPage(cursor, 200);
+      products.push(...page.items);
+      cursor = page.nextCursor;
+    } while (cursor);
+    return products;
+  },
+
   // Contact
   submitContactInquiry: async (inquiryData) => {
     const response = await apiClient.post('/contact/inquiry', inquiryData);
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Index Usage Test for Sun Star International
+Reconciles the declared indexes on a scratch database and checks with
+explain() that every query issued by the API routes uses an index
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING
+
+from indexes import reconcile_indexes
+from outbox import INQUIRY_DIGEST, claimable, due, expired_leases
+from pagination import KeysetPage, encode_cursor
+from part_lookup import normalize_key, trigrams
+from queries import (
+    ADVANTAGES_ORDER, active_advantages, active_testimonials, category_products, image_by_digest, inquiries_filter,
+    part_number_candidates, part_number_exact, product_facets, product_search, products_by_ids,
+    ratings_filter, referenced_image
+)
+
+# Test configuration
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+TEST_DB_NAME = "sunstar_index_test"
+
+NOW = datetime(2025, 1, 1)
+CURSOR = encode_cursor(NOW, "m")
+NEWEST_FIRST = KeysetPage(direction=-1)
+OLDEST_FIRST = KeysetPage(direction=1)
+
+# (route, collection, filter, sort) for every indexed query in routes.py,
+# uploads.py and outbox.py, built by the same helpers those modules call
+ROUTE_QUERIES = [
+    ("GET /products/category/{id}", "products", category_products("1"), None),
+    ("GET /testimonials", "testimonials", active_testimonials(True), None),
+    ("GET /testimonials?featured_only=false", "testimonials", active_testimonials(False), None),
+    ("GET /advantages", "advantages", active_advantages(), ADVANTAGES_ORDER),
+    ("GET /contact/inquiries", "inquiries", NEWEST_FIRST.query(inquiries_filter(None), None), NEWEST_FIRST.sort),
+    ("GET /contact/inquiries?cursor=", "inquiries", NEWEST_FIRST.query(inquiries_filter(None), CURSOR), NEWEST_FIRST.sort),
+    ("GET /contact/inquiries?status=", "inquiries", NEWEST_FIRST.query(inquiries_filter("new"), None), NEWEST_FIRST.sort),
+    ("GET /ratings", "customer_ratings", NEWEST_FIRST.query(ratings_filter(None), None), NEWEST_FIRST.sort),
+    ("GET /ratings?cursor=", "customer_ratings", NEWEST_FIRST.query(ratings_filter(None), CURSOR), NEWEST_FIRST.sort),
+    ("GET /ratings?category=", "customer_ratings", NEWEST_FIRST.query(ratings_filter("parts"), None), NEWEST_FIRST.sort),
+    ("GET /admin/products", "admin_products", OLDEST_FIRST.query({}, None), OLDEST_FIRST.sort),
+    ("GET /admin/products?cursor=", "admin_products", OLDEST_FIRST.query({}, CURSOR), OLDEST_FIRST.sort),
+    ("PUT/DELETE /admin/products/{id}", "admin_products", {"id": "product-1"}, None),
+    ("GET /products/search", "admin_products", product_search("hydraulic pump", None), None),
+    ("GET /products/search?category_id=", "admin_products", product_search("pump", "2,3"), None),
+    ("GET /products/lookup (exact)", "admin_products", part_number_exact(normalize_key("04152-YZZA1")), None),
+    ("GET /products/lookup (trigrams)", "admin_products",
+     part_number_candidates(sorted(trigrams(normalize_key("04152-YZZA1")))), None),
+    ("GET /products/lookup (winners)", "admin_products", products_by_ids(["product-1", "product-2"]), None),
+    ("GET /products/facets", "admin_products",
+     product_facets(category_id="2", available=True, min_price=100, max_price=5000, currency="AED"), None),
+    ("GET /products/facets?min_price=", "admin_products", product_facets(min_price=100, currency="AED"), None),
+    ("GET /products/facets?currency=", "admin_products", product_facets(currency="USD"), None),
+    ("outbox_worker claim", "outbox", claimable(NOW), [("available_at", ASCENDING)]),
+    ("outbox_worker digest", "outbox", due(INQUIRY_DIGEST, NOW), [("created_at", ASCENDING)]),
+    ("outbox_worker expired leases", "outbox", expired_leases(NOW), None),
+    ("POST /upload/images (dedup)", "images", image_by_digest(f"{7:064x}"), None),
+    ("DELETE /upload/image/{filename}", "images", referenced_image(f"{7:064x}.jpg"), None),
+]
+
+def plan_stages(plan: Dict[str, Any]):
+    """Yield every stage name of a (possibly nested) query plan"""
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from plan_stages(child)
+
+class IndexUsageTester:
+    def __init__(self):
+        self.client = None
+        self.db = None
+        self.test_results = []
+
+    async def setup(self):
+        """Create a scratch database with a few documents per collection"""
+        self.client = AsyncIOMotorClient(MONGO_URL)
+        await self.client.drop_database(TEST_DB_NAME)
+        self.db = self.client[TEST_DB_NAME]
+
+        documents = [
+            {"id": f"product-{i}", "category_id": str(i % 4 + 1), "status": "new",
+             "name": f"Hydraulic pump {i}", "description": "Replacement pump for excavators",
+             "part_number_key": f"04152YZZA{i}", "lookup_trigrams": ["^04", "041", "415", f"A{i}$"],
+             "service_category": "parts", "is_active": True, "is_featured": i % 2 == 0,
+             "order": i, "is_available": True, "price_amount": float(i * 100),
+             "price_currency": ("AED", "USD")[i % 2], "created_at": NOW - timedelta(minutes=i),
+             "available_at": NOW - timedelta(minutes=i), "lease_until": NOW + timedelta(minutes=i)}
+            for i in range(50)
+        ]
+        for collection in ("products", "testimonials", "advantages", "inquiries", "customer_ratings", "admin_products", "outbox"):
+            await self.db[collection].insert_many([dict(document) for document in documents])
+        # Unique keys, so these get their own documents
+        await self.db.images.insert_many([
+            {"sha256": f"{i:064x}", "filename": f"{i:064x}.jpg", "refs": 1, "size": 1024, "created_at": NOW}
+            for i in range(50)
+        ])
+
+    async def cleanup(self):
+        """Drop the scratch database"""
+        if self.client:
+            await self.client.drop_database(TEST_DB_NAME)
+            self.client.close()
+
+    def log_test(self, test_name: str, success: bool, message: str, details: Dict = None):
+        """Log test result"""
+        result = {
+            "test": test_name,
+            "success": success,
+            "message": message,
+            "timestamp": datetime.now().isoformat(),
+            "details": details or {}
+        }
+        self.test_results.append(result)
+
+        status = "✅ PASS" if success else "❌ FAIL"
+        print(f"{status} {test_name}: {message}")
+        if details:
+            for key, value in details.items():
+                print(f"    {key}: {value}")
+        print()
+
+    async def test_reconcile(self):
+        """Reconciling creates every declared index and nothing is left missing"""
+        report = await reconcile_indexes(self.db)
+        second = await reconcile_indexes(self.db, create=False)
+        success = not report["errors"] and not any(second[key] for key in ("missing", "outdated", "conflicts"))
+        self.log_test(
+            "Index reconciliation",
+            success,
+            f"Created {len(report['created'])} indexes",
+            {"errors": report["errors"], "missing after reconcile": second["missing"]}
+        )
+        return success
+
+    async def test_route_query(self, route: str, collection: str, filter_query: Dict, sort):
+        """The query plan of a route uses an index and never scans the collection"""
+        cursor = self.db[collection].find(filter_query, {"_id": 0})
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.limit(50).explain()
+        stages = list(plan_stages(explain["queryPlanner"]["winningPlan"]))
+        success = "IXSCAN" in stages and "COLLSCAN" not in stages
+        self.log_test(route, success, " -> ".join(stages))
+        return success
+
+    async def run_all_tests(self):
+        """Run all index usage tests"""
+        await self.setup()
+        try:
+            passed = 0
+            total = 0
+
+            if await self.test_reconcile():
+                passed += 1
+            total += 1
+
+            for route, collection, filter_query, sort in ROUTE_QUERIES:
+                if await self.test_route_query(route, collection, filter_query, sort):
+                    passed += 1
+                total += 1
+
+            print("\n📊 INDEX USAGE TEST SUMMARY")
+            print("=" * 60)
+            print(f"Total Tests: {total}")
+            print(f"Passed: {passed}")
+            print(f"Failed: {total - passed}")
+
+            return passed, total
+        finally:
+            await self.cleanup()
+
+async def main():
+    """Main test execution"""
+    print("🔧 Index Usage Test Suite")
+    print("=" * 80)
+
+    tester = IndexUsageTester()
+    try:
+        passed, total = await tester.run_all_tests()
+        sys.exit(0 if passed == total else 1)
+    except KeyboardInterrupt:
+        print("\n⚠️ Tests interrupted by user")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n❌ Test execution failed: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
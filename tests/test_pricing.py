@@ -0,0 +1,69 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from pricing import parse_price
+
+
+@pytest.mark.parametrize("price, expected", [
+    ("AED 12,500", (12500.0, "AED")),
+    ("$25k", (25000.0, "USD")),
+    ("US$ 1,200", (1200.0, "USD")),
+    ("12.500,00 €", (12500.0, "EUR")),
+    ("AED12,500", (12500.0, "AED")),
+    ("12 500 AED", (12500.0, "AED")),
+    ("DHS 4,000", (4000.0, "AED")),
+    ("50 BIRR", (50.0, "ETB")),
+    ("300", (300.0, "AED")),
+    ("Price: AED 90,000 (negotiable)", (90000.0, "AED")),
+])
+def test_plain_prices(price, expected):
+    assert parse_price(price) == expected
+
+
+@pytest.mark.parametrize("price, expected", [
+    # The amount is the number next to the currency, not the first digits
+    ("4x4 SUV AED 90000", (90000.0, "AED")),
+    ("Toyota V8 AED 250k", (250000.0, "AED")),
+    # Multiplier words apply to the amount
+    ("AED 5 Million", (5_000_000.0, "AED")),
+    ("1,5 M USD", (1_500_000.0, "USD")),
+])
+def test_amount_next_to_currency(price, expected):
+    assert parse_price(price) == expected
+
+
+@pytest.mark.parametrize("price", [
+    "Call +971 50 123 4567",
+    "050-123-4567",
+    "AED 3,670 / USD 1,000",
+    "USD 1,000 or AED 3,670",
+    "Contact for Price",
+    "",
+    None,
+])
+def test_ambiguous_or_missing_prices(price):
+    assert parse_price(price) == (None, None)
+
+
+def test_code_and_symbol_of_one_currency_agree():
+    assert parse_price("GBP £85") == (85.0, "GBP")
+    assert parse_price("EUR 100 (approx. £85)") == (None, None)
+
+
+@pytest.mark.parametrize("price, expected", [
+    # A separator before exactly three digits groups thousands, whichever it is
+    ("12.500 €", (12500.0, "EUR")),
+    ("1.500.000 AED", (1_500_000.0, "AED")),
+    ("USD 12,500", (12500.0, "USD")),
+    ("1,500,000 AED", (1_500_000.0, "AED")),
+    # Before any other number of digits it is the decimal point
+    ("12.5 €", (12.5, "EUR")),
+    ("AED 99.99", (99.99, "AED")),
+    ("12,50 €", (12.5, "EUR")),
+])
+def test_dots_and_commas_group_alike(price, expected):
+    assert parse_price(price) == expected